@@ -1,5 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db import DatabaseError
 
 
 class ApiConfig(AppConfig):
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .catalog import ingredient_catalog
+
+        if settings.INGREDIENT_SEARCH_BACKEND == 'memory':
+            try:
+                ingredient_catalog.get()
+            except DatabaseError:
+                pass
@@ -0,0 +1,66 @@
+import hashlib
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+
+def get_generation(key):
+    return cache.get_or_set(key, 1, None)
+
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def get_generation_key(prefix, pk=None):
+    if pk is None:
+        return f'{prefix}:generation'
+    return f'{prefix}:{pk}:generation'
+
+
+def invalidate_response_cache(prefix, pks=None):
+    """
+    Сбрасывает кэш списка и перечисленных объектов после фиксации
+    транзакции: иначе параллельный запрос может закэшировать еще
+    старые данные под новым поколением.
+    Без pks сбрасываются все объекты с этим префиксом.
+    """
+    if pks is not None:
+        pks = list(pks)
+    transaction.on_commit(partial(bump_response_cache, prefix, pks))
+
+
+def bump_response_cache(prefix, pks=None):
+    if pks is None:
+        bump_generation(get_generation_key(prefix))
+        return
+    bump_generation(get_generation_key(prefix, 'list'))
+    for pk in pks:
+        bump_generation(get_generation_key(prefix, pk))
+
+
+def get_response_cache_key(prefix, request, pk=None):
+    """
+    Ключ кэша из поколений префикса и объекта, формата ответа
+    и нормализованных параметров фильтрации и пагинации.
+    """
+    params = urlencode(sorted(
+        (key, sorted(request.query_params.getlist(key)))
+        for key in request.query_params
+    ), doseq=True)
+    generations = [get_generation(get_generation_key(prefix))]
+    generations.append(get_generation(
+        get_generation_key(prefix, 'list' if pk is None else pk)))
+    digest = hashlib.md5(params.encode()).hexdigest()
+    return ':'.join([
+        prefix,
+        'list' if pk is None else str(pk),
+        *(str(generation) for generation in generations),
+        request.accepted_renderer.format,
+        digest,
+    ])
@@ -0,0 +1,106 @@
+import bisect
+import threading
+import time
+
+from django.conf import settings
+
+from core.versions import get_versions
+from recipes.models import Ingredient, Tag
+
+
+class IngredientCatalog:
+    """
+    Неизменяемый снимок справочника ингредиентов в памяти.
+    Поиск по началу названия идет бинарным поиском
+    по отсортированному списку названий в нижнем регистре.
+    """
+
+    def __init__(self, rows):
+        items = sorted(
+            (name.lower(), name, pk, measurement_unit)
+            for pk, name, measurement_unit in rows
+        )
+        self.keys = tuple(item[0] for item in items)
+        self.items = tuple(
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, name, pk, measurement_unit in items
+        )
+        self.ordered = tuple(sorted(self.items, key=lambda x: x['name']))
+        self.by_id = {item['id']: item for item in self.items}
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, pk):
+        return self.by_id.get(pk)
+
+    def search(self, term):
+        """
+        Возвращает ингредиенты, содержащие term: сначала
+        совпадения по началу названия, затем остальные.
+        """
+        if not term:
+            return list(self.ordered)
+        start = bisect.bisect_left(self.keys, term)
+        end = bisect.bisect_left(self.keys, term + '\U0010ffff', start)
+        contains = [
+            item for key, item in zip(self.keys, self.items)
+            if term in key and not key.startswith(term)
+        ]
+        return list(self.items[start:end]) + contains
+
+
+class VersionedSnapshot:
+    """
+    Данные модели в памяти процесса. Сбрасываются сигналами,
+    а раз в INGREDIENT_CATALOG_CHECK_INTERVAL секунд сверяются
+    с версией модели: изменения могли прийти из другого процесса.
+    """
+
+    def __init__(self, model, loader):
+        self.model = model
+        self.loader = loader
+        self.value = None
+        self.version = None
+        self.updated = None
+        self.checked = 0
+        self.lock = threading.Lock()
+
+    def get_version(self):
+        (version, updated), = get_versions([self.model])
+        return version, updated
+
+    def is_outdated(self):
+        now = time.monotonic()
+        if now - self.checked < settings.INGREDIENT_CATALOG_CHECK_INTERVAL:
+            return False
+        self.checked = now
+        version, _ = self.get_version()
+        return version != self.version
+
+    def get(self):
+        value = self.value
+        if value is None or self.is_outdated():
+            with self.lock:
+                if self.value is value:
+                    self.version, self.updated = self.get_version()
+                    self.value = self.loader()
+                    self.checked = time.monotonic()
+                value = self.value
+        return value
+
+    def invalidate(self):
+        self.value = None
+
+
+def load_ingredients():
+    return IngredientCatalog(
+        Ingredient.objects.values_list('id', 'name', 'measurement_unit'))
+
+
+def load_tag_slugs():
+    return dict(Tag.objects.values_list('slug', 'id'))
+
+
+ingredient_catalog = VersionedSnapshot(Ingredient, load_ingredients)
+tag_slugs = VersionedSnapshot(Tag, load_tag_slugs)
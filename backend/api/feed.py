@@ -0,0 +1,102 @@
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Exists, OuterRef
+
+from core.bulk import insert_rows
+from recipes.models import Recipe
+from users.models import FeedEntry, Follow
+
+# Подписчиков на одну вставку при рассылке рецепта.
+FAN_OUT_CHUNK_SIZE = 1000
+# SQLite ограничивает число параметров в запросе.
+AUTHORS_CHUNK_SIZE = 500
+FEED_FIELDS = ['user', 'recipe', 'author', 'pub_date']
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты всех подписчиков автора."""
+    followers = Follow.objects.filter(
+        author_id=recipe.author_id).values_list('user_id', flat=True)
+    followers = followers.iterator(FAN_OUT_CHUNK_SIZE)
+    while True:
+        chunk = list(islice(followers, FAN_OUT_CHUNK_SIZE))
+        if not chunk:
+            return
+        FeedEntry.objects.bulk_create(
+            (FeedEntry(user_id=user_id, recipe_id=recipe.id,
+                       author_id=recipe.author_id, pub_date=recipe.pub_date)
+             for user_id in chunk),
+            ignore_conflicts=True,
+        )
+
+
+def get_backfill_recipes(author_id):
+    return Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+        'id', 'pub_date')[:settings.FEED_BACKFILL_SIZE]
+
+
+def backfill_feed(user_id, author_id):
+    """Добавляет в ленту последние FEED_BACKFILL_SIZE рецептов автора."""
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                   pub_date=pub_date)
+         for recipe_id, pub_date in get_backfill_recipes(author_id)),
+        ignore_conflicts=True,
+    )
+
+
+def trim_feed(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def remove_unfollowed_entries():
+    """Удаляет записи лент, подписки для которых уже нет."""
+    FeedEntry.objects.annotate(followed=Exists(Follow.objects.filter(
+        user_id=OuterRef('user_id'), author_id=OuterRef('author_id')
+    ))).filter(followed=False).delete()
+
+
+def fill_feeds(follows):
+    """
+    Добавляет в ленты по подпискам follows последние FEED_BACKFILL_SIZE
+    рецептов авторов. Уже существующие записи не трогаются.
+    """
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    latest = {}
+    recipes = Recipe.objects.filter(
+        author__in=follows.values('author')
+    ).order_by('author', '-pub_date', '-id').values_list(
+        'author_id', 'id', 'pub_date')
+    for author_id, recipe_id, pub_date in recipes.iterator():
+        author_recipes = latest.setdefault(author_id, [])
+        if len(author_recipes) < settings.FEED_BACKFILL_SIZE:
+            author_recipes.append((recipe_id, adapt_datetime(pub_date)))
+    rows = []
+    for user_id, author_id in follows.order_by().values_list(
+            'user_id', 'author_id').iterator():
+        rows.extend((user_id, recipe_id, author_id, pub_date)
+                    for recipe_id, pub_date in latest.get(author_id, ()))
+        if len(rows) >= FAN_OUT_CHUNK_SIZE:
+            insert_rows(FeedEntry, FEED_FIELDS, rows, ignore_conflicts=True)
+            rows = []
+    insert_rows(FeedEntry, FEED_FIELDS, rows, ignore_conflicts=True)
+
+
+def rebuild_feeds(author_ids=None):
+    """
+    Дополняет ленты после загрузки данных в обход API: по подпискам
+    на authors_ids или, без них, по всем подпискам с удалением записей
+    отписавшихся. История лент при этом не обрезается.
+    """
+    if author_ids is None:
+        remove_unfollowed_entries()
+        fill_feeds(Follow.objects.all())
+        return
+    author_ids = list(author_ids)
+    for start in range(0, len(author_ids), AUTHORS_CHUNK_SIZE):
+        fill_feeds(Follow.objects.filter(
+            author_id__in=author_ids[start:start + AUTHORS_CHUNK_SIZE]))
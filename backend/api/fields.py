@@ -1,13 +1,71 @@
-import base64
+import binascii
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import (SimpleUploadedFile,
+                                            TemporaryUploadedFile)
 from rest_framework import serializers
 
+# Кратно 4, чтобы каждый кусок base64 декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+
+
+def get_decoded_size(imgstr):
+    padding = imgstr[-2:].count('=')
+    return len(imgstr) // 4 * 3 - padding
+
+
+def decode_base64(imgstr, name, content_type):
+    """
+    Декодирует base64 по частям. Крупные файлы пишутся
+    во временный файл на диске, а не собираются в памяти.
+    """
+    size = get_decoded_size(imgstr)
+    if size <= settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+        return SimpleUploadedFile(
+            name, binascii.a2b_base64(imgstr), content_type)
+    file = TemporaryUploadedFile(name, content_type, size, None)
+    for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+        file.write(binascii.a2b_base64(
+            imgstr[start:start + DECODE_CHUNK_SIZE]))
+    file.seek(0)
+    return file
+
 
 class Base64ImageField(serializers.ImageField):
+    default_error_messages = {
+        'too_large': 'Размер изображения не должен превышать {max_size} байт.',
+        'too_many_pixels': 'Изображение слишком большое: {pixels} пикселей.',
+        'invalid_base64': 'Некорректные данные изображения.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-        return super().to_internal_value(data)
+            if len(imgstr) % 4:
+                self.fail('invalid_base64')
+            if get_decoded_size(imgstr) > settings.IMAGE_UPLOAD_MAX_SIZE:
+                self.fail('too_large',
+                          max_size=settings.IMAGE_UPLOAD_MAX_SIZE)
+            try:
+                data = decode_base64(imgstr, 'temp.' + ext, format[5:])
+            except binascii.Error:
+                self.fail('invalid_base64')
+        file = super().to_internal_value(data)
+        width, height = file.image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            self.fail('too_many_pixels', pixels=width * height)
+        return file
+
+
+class ImageVariantField(serializers.ImageField):
+    """Уменьшенная копия изображения, пока её нет - оригинал."""
+
+    def __init__(self, fallback='image', **kwargs):
+        kwargs['read_only'] = True
+        self.fallback = fallback
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        return (super().get_attribute(instance)
+                or getattr(instance, self.fallback))
@@ -1,15 +1,28 @@
 import django_filters
+from django.db.models import Case, IntegerField, Value, When
 from rest_framework import filters
 
-from recipes.models import Recipe, Tag
+from recipes.models import Recipe
 from users.models import User
+from .catalog import tag_slugs
+
+
+# Порядок ?ordering=: колонки обновляются счетчиками и update_trending.
+RECIPE_ORDERINGS = {
+    'popular': ('-favorites_count', '-id'),
+    'trending': ('-trending_score', '-id'),
+}
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in tag_slugs.get()]
 
 
 class RecipeFilter(django_filters.FilterSet):
-    tags = django_filters.filters.ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all())
+    tags = django_filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags',
+    )
     author = django_filters.filters.ModelChoiceFilter(
         queryset=User.objects.all())
     is_favorited = django_filters.CharFilter(
@@ -18,6 +31,22 @@ class RecipeFilter(django_filters.FilterSet):
     is_in_shopping_cart = django_filters.CharFilter(
         method='filter_is_in_shopping_cart',
     )
+    ordering = django_filters.ChoiceFilter(
+        choices=[(key, key) for key in RECIPE_ORDERINGS],
+        method='filter_ordering',
+    )
+
+    def filter_tags(self, queryset, name, value):
+        """
+        Рецепты хотя бы с одним из тегов. Подзапрос вместо JOIN
+        не дублирует рецепты с несколькими подходящими тегами.
+        """
+        if not value:
+            return queryset
+        slugs = tag_slugs.get()
+        recipes = Recipe.tags.through.objects.filter(
+            tag_id__in=[slugs[slug] for slug in value if slug in slugs])
+        return queryset.filter(id__in=recipes.values('recipe_id'))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
@@ -31,10 +60,34 @@ class RecipeFilter(django_filters.FilterSet):
             return queryset.filter(shopping_cart=user)
         return queryset
 
+    def filter_ordering(self, queryset, name, value):
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
+
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart',
+                  'ordering')
+
+
+class IngredientSearchFilter(filters.BaseFilterBackend):
+    """
+    Поиск ингредиентов по вхождению в название: сначала
+    совпадения по началу названия, затем остальные.
+    """
+    search_param = 'name'
 
+    def get_search_term(self, request):
+        return request.query_params.get(
+            self.search_param, '').strip().lower()
 
-class CustomSearchFilter(filters.SearchFilter):
-    search_param = "name"
+    def filter_queryset(self, request, queryset, view):
+        name = self.get_search_term(request)
+        if not name:
+            return queryset
+        return queryset.filter(name_lower__contains=name).annotate(
+            search_rank=Case(
+                When(name_lower__startswith=name, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField(),
+            )
+        ).order_by('search_rank', 'name_lower')
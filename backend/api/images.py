@@ -0,0 +1,129 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+from recipes.models import Recipe
+from .cache import invalidate_response_cache
+
+logger = logging.getLogger(__name__)
+
+# Вариант, которым заменяется загруженный оригинал.
+FULL_VARIANT = 'full'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def get_variant_format():
+    if settings.IMAGE_VARIANT_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def get_variant_name(name, variant):
+    """
+    Имя уменьшенной копии рядом с оригиналом. Для уже замененного
+    изображения (photo_full.webp) копии называются как для photo.
+    """
+    root, _ = os.path.splitext(name)
+    _, ext = get_variant_format()
+    suffix = f'_{FULL_VARIANT}'
+    if name.endswith(f'{suffix}.{ext}'):
+        root = root[:-len(suffix)]
+    return f'{root}_{variant}.{ext}'
+
+
+def encode_variant(image, size):
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    format, _ = get_variant_format()
+    if format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    result = BytesIO()
+    image.save(result, format, quality=settings.IMAGE_VARIANT_QUALITY)
+    return result.getvalue()
+
+
+def generate_variants(name):
+    """
+    Перекодирует изображение в уменьшенные копии из IMAGE_VARIANTS.
+    Возвращает словарь {вариант: имя файла в хранилище}.
+    """
+    largest = max(settings.IMAGE_VARIANTS.values())
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        # JPEG декодируется сразу в уменьшенном масштабе.
+        image.draft('RGB', largest)
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands()
+                                  else 'RGB')
+        variants = {}
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            variant_name = get_variant_name(name, variant)
+            if variant_name == name:
+                # Исходник уже перекодирован в этот вариант.
+                variants[variant] = name
+                continue
+            if default_storage.exists(variant_name):
+                default_storage.delete(variant_name)
+            variants[variant] = default_storage.save(
+                variant_name, ContentFile(encode_variant(image, size)))
+    return variants
+
+
+def render_recipe_variants(name):
+    """
+    Собирает копии и сохраняет их в рецептах с этим изображением:
+    оригинал заменяется вариантом full и удаляется из хранилища.
+    """
+    variants = generate_variants(name)
+    recipes = Recipe.objects.filter(image=name)
+    pks = list(recipes.values_list('pk', flat=True))
+    updated = recipes.update(
+        image=variants[FULL_VARIANT],
+        image_small=variants['small'],
+        image_medium=variants['medium'],
+    )
+    if updated and variants[FULL_VARIANT] != name:
+        default_storage.delete(name)
+    invalidate_response_cache('recipes', pks)
+    return variants
+
+
+def render_in_worker(name):
+    """Задача пула: закрывает устаревшие соединения потока с базой."""
+    close_old_connections()
+    try:
+        return render_recipe_variants(name)
+    finally:
+        close_old_connections()
+
+
+def log_variant_errors(future):
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось собрать копии изображения',
+                     exc_info=(type(error), error, error.__traceback__))
+
+
+def submit_variants(name):
+    """Ставит генерацию копий в фоновый пул потоков."""
+    if settings.IMAGE_WORKERS:
+        future = get_executor().submit(render_in_worker, name)
+        future.add_done_callback(log_variant_errors)
+        return future
+    return render_recipe_variants(name)
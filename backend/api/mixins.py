@@ -1,16 +1,248 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import mixins, permissions, status, viewsets
+from rest_framework import (exceptions, mixins, permissions, status,
+                            viewsets)
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from core.timing import measure
+from core.versions import get_versions
 from recipes.models import Recipe
-from .filters import RecipeFilter
-from .pagination import PageLimitPagination
+from .cache import get_response_cache_key
+from .catalog import ingredient_catalog
+from .filters import IngredientSearchFilter, RecipeFilter
+from .pagination import CursorLimitPagination, PageLimitPagination
+from .profiling import get_profiler, get_requested_mode, save_profile
 from .permissions import AuthorOrAuthOrReadOnly
+from .queries import QueryCounter, report_overage
 from .serializers import RecipesSubscribeSerializer
 
 
+class ProfilingMixin:
+    """
+    Профилирует dispatch целиком: по заголовку X-Profile для персонала
+    (имя файла возвращается в X-Profile-Id) или долю PROFILE_SAMPLE_RATE
+    запросов. Профили пишутся в PROFILE_DIR, см. profile_summary.
+    """
+
+    def is_profiling_allowed(self, request):
+        try:
+            return self.initialize_request(request).user.is_staff
+        except exceptions.APIException:
+            return False
+
+    def dispatch(self, request, *args, **kwargs):
+        mode, requested = get_requested_mode(request)
+        if requested and not self.is_profiling_allowed(request):
+            mode = None
+        if mode is None:
+            return super().dispatch(request, *args, **kwargs)
+        profiler = get_profiler(mode)
+        profiler.enable()
+        try:
+            response = super().dispatch(request, *args, **kwargs)
+        finally:
+            profiler.disable()
+        name = save_profile(
+            profiler, mode, f'{type(self).__name__}.{self.action}')
+        if requested:
+            response['X-Profile-Id'] = name
+        return response
+
+
+class TimedRenderer:
+    """Обертка рендерера, замеряющая render() для Server-Timing."""
+
+    def __init__(self, renderer):
+        self.renderer = renderer
+
+    def __getattr__(self, name):
+        return getattr(self.renderer, name)
+
+    def render(self, *args, **kwargs):
+        with measure('render'):
+            return self.renderer.render(*args, **kwargs)
+
+
+class ServerTimingMixin:
+    """
+    Передает в ServerTimingMiddleware время сериализации
+    (to_representation сериализатора из get_serializer) и рендеринга.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+
+        def timed_to_representation(instance):
+            with measure('serialize'):
+                return to_representation(instance)
+
+        serializer.to_representation = timed_to_representation
+        return serializer
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        renderer = getattr(response, 'accepted_renderer', None)
+        if renderer is not None and not isinstance(renderer, TimedRenderer):
+            response.accepted_renderer = TimedRenderer(renderer)
+        return response
+
+
+class QueryBudgetMixin:
+    """
+    Ограничивает число запросов к базе на действие:
+    query_budgets = {'list': 8}. При QUERY_BUDGET_STRICT превышение
+    роняет запрос, иначе пишется в лог с отпечатками SQL.
+    """
+    query_budgets = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        action_map = getattr(self, 'action_map', None) or {}
+        action = action_map.get(request.method.lower())
+        budget = self.query_budgets.get(action)
+        if budget is None:
+            return super().dispatch(request, *args, **kwargs)
+        with QueryCounter() as counter:
+            response = super().dispatch(request, *args, **kwargs)
+        if len(counter) > budget:
+            report_overage(type(self).__name__, action, budget, counter,
+                           settings.QUERY_BUDGET_STRICT)
+        return response
+
+
+class VersionedETagMixin:
+    """
+    Добавляет ETag и Last-Modified по версиям моделей etag_models
+    и отвечает 304 на условные запросы без обращения к сериализатору.
+    """
+    etag_models = ()
+
+    def get_etag_versions(self):
+        return get_versions(self.etag_models)
+
+    def get_etag_state(self, request):
+        versions = self.get_etag_versions()
+        key = ':'.join([
+            request.get_full_path(),
+            request.META.get('HTTP_ACCEPT', ''),
+            *(str(version) for version, _ in versions),
+        ])
+        etag = quote_etag(hashlib.md5(key.encode()).hexdigest())
+        updated = [updated for _, updated in versions if updated is not None]
+        last_modified = int(max(updated).timestamp()) if updated else None
+        return etag, last_modified
+
+    def get_versioned_response(self, handler, request, *args, **kwargs):
+        etag, last_modified = self.get_etag_state(request)
+        not_modified = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['ETag'] = etag
+            return not_modified
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_versioned_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_versioned_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    """
+    Включает курсорную пагинацию по запросу:
+    ?pagination=cursor для первой страницы, далее ?cursor=.
+    """
+    cursor_pagination_class = CursorLimitPagination
+
+    def use_cursor_pagination(self):
+        params = self.request.query_params
+        return 'cursor' in params or params.get('pagination') == 'cursor'
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            if self.use_cursor_pagination():
+                self._paginator = self.cursor_pagination_class()
+            elif self.pagination_class is None:
+                self._paginator = None
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы list и retrieve для анонимных пользователей.
+    Кэш сбрасывается сигналами через invalidate_response_cache.
+    """
+    cache_prefix = None
+
+    def get_cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = get_response_cache_key(
+            self.cache_prefix, request, kwargs.get(self.lookup_field))
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, settings.RESPONSE_CACHE_TIMEOUT)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+
+class IngredientCatalogMixin:
+    """
+    Отвечает из справочника ингредиентов в памяти,
+    если включен INGREDIENT_SEARCH_BACKEND = 'memory'.
+    """
+
+    def use_catalog(self):
+        return settings.INGREDIENT_SEARCH_BACKEND == 'memory'
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_catalog():
+            return super().list(request, *args, **kwargs)
+        term = IngredientSearchFilter().get_search_term(request)
+        return Response(ingredient_catalog.get().search(term))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_catalog():
+            return super().retrieve(request, *args, **kwargs)
+        ingredient_id = kwargs['id']
+        ingredient = None
+        if ingredient_id.isdigit():
+            ingredient = ingredient_catalog.get().get(int(ingredient_id))
+        if ingredient is None:
+            raise Http404
+        return Response(ingredient)
+
+
 class CreateListRetrieveViewSet(
     mixins.CreateModelMixin,
     mixins.ListModelMixin,
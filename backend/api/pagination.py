@@ -1,7 +1,43 @@
-from rest_framework.pagination import PageNumberPagination
+from collections import OrderedDict
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
 
 
 class PageLimitPagination(PageNumberPagination):
     page_query_param = "page"
     page_size_query_param = "limit"
     max_page_size = 100
+
+
+class CursorLimitPagination(CursorPagination):
+    """
+    Курсорная пагинация по (pub_date, id) без OFFSET и COUNT(*).
+    Общее количество считается только при count=true.
+    """
+    page_size = 6
+    page_size_query_param = "limit"
+    max_page_size = 100
+    ordering = ('-pub_date', '-id')
+    count_query_param = "count"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = None
+        if request.query_params.get(self.count_query_param) in (
+                '1', 'true'):
+            self.count = queryset.count()
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        content = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            content.insert(0, ('count', self.count))
+        return Response(OrderedDict(content))
+
+
+class UserCursorLimitPagination(CursorLimitPagination):
+    ordering = ('-date_joined', '-id')
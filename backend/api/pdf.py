@@ -0,0 +1,131 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from .utils import html_to_pdf
+
+PDF_TEMPLATE = 'spisok_template.html'
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.PDF_RENDER_WORKERS)
+    return _executor
+
+
+def get_job_id(user, shopping_list):
+    """Хэш содержимого списка покупок пользователя."""
+    content = json.dumps(
+        [user.id, list(shopping_list)], sort_keys=True, default=str)
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_user_dir(user_id):
+    return os.path.join(settings.SHOPPING_CART_PDF_ROOT, str(user_id))
+
+
+def get_pdf_path(user_id, job_id):
+    return os.path.join(get_user_dir(user_id), f'{job_id}.pdf')
+
+
+def render_pdf_file(html, path):
+    """
+    Собирает PDF и атомарно сохраняет его в кэш.
+    При ошибке оставляет метку .error вместо .pending.
+    """
+    pending, error = f'{path}.pending', f'{path}.error'
+    failed = True
+    try:
+        content = html_to_pdf(html)
+        if content is None:
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as pdf:
+            pdf.write(content)
+        os.replace(tmp_path, path)
+        failed = False
+        return True
+    finally:
+        if failed:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            open(error, 'w').close()
+        elif os.path.exists(error):
+            os.remove(error)
+        if os.path.exists(pending):
+            os.remove(pending)
+
+
+def remove_stale_files(user_id, job_id):
+    """
+    Удаляет файлы прошлых списков покупок пользователя, в которые
+    уже точно не пишет ни одна сборка. Файлы задачи job_id остаются.
+    """
+    user_dir = get_user_dir(user_id)
+    deadline = time.time() - settings.PDF_RENDER_TIMEOUT
+    for name in os.listdir(user_dir):
+        path = os.path.join(user_dir, name)
+        try:
+            if (not name.startswith(job_id)
+                    and os.path.getmtime(path) < deadline):
+                os.remove(path)
+        except FileNotFoundError:
+            # Файл уже удалил параллельный запрос.
+            continue
+
+
+def claim_job(path):
+    """
+    Создает метку задачи. Возвращает False, если задача уже
+    поставлена другим процессом и не устарела.
+    """
+    pending = f'{path}.pending'
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        os.close(os.open(pending, os.O_CREAT | os.O_EXCL))
+        return True
+    except FileExistsError:
+        age = time.time() - os.path.getmtime(pending)
+        if age < settings.PDF_RENDER_TIMEOUT:
+            return False
+        os.utime(pending)
+        return True
+
+
+def submit_pdf(user, shopping_list):
+    """
+    Ставит в очередь сборку PDF для списка покупок,
+    если для этого содержимого файла еще нет.
+    """
+    rows = list(shopping_list)
+    job_id = get_job_id(user, rows)
+    path = get_pdf_path(user.id, job_id)
+    if os.path.exists(path) or not claim_job(path):
+        return job_id
+    remove_stale_files(user.id, job_id)
+    html = render_to_string(PDF_TEMPLATE, {'data': rows})
+    if settings.PDF_RENDER_WORKERS:
+        get_executor().submit(render_pdf_file, html, path)
+    else:
+        render_pdf_file(html, path)
+    return job_id
+
+
+def get_pdf_status(user, job_id):
+    path = get_pdf_path(user.id, job_id)
+    if os.path.exists(path):
+        return 'ready'
+    if os.path.exists(f'{path}.pending'):
+        return 'pending'
+    if os.path.exists(f'{path}.error'):
+        return 'failed'
+    return None
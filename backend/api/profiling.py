@@ -0,0 +1,99 @@
+import cProfile
+import os
+import random
+import sys
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.utils import timezone
+
+MODES = ('cprofile', 'sampling')
+EXTENSIONS = {'cprofile': '.prof', 'sampling': '.collapsed'}
+
+
+def get_requested_mode(request):
+    """
+    Режим профилирования из заголовка X-Profile (1 - cProfile)
+    или 'sampling' для доли PROFILE_SAMPLE_RATE всех запросов.
+    """
+    header = request.META.get('HTTP_X_PROFILE', '').lower()
+    if header in MODES:
+        return header, True
+    if header in ('1', 'true'):
+        return 'cprofile', True
+    rate = settings.PROFILE_SAMPLE_RATE
+    if rate and random.random() < rate:
+        return 'sampling', False
+    return None, False
+
+
+class StackSampler:
+    """
+    Снимает стек потока запроса каждые interval секунд
+    и считает одинаковые стеки (формат collapsed для flamegraph).
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self.thread.start()
+
+    def disable(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w', encoding='utf8') as file:
+            for stack, count in self.stacks.items():
+                file.write(f'{stack} {count}\n')
+
+
+def get_profiler(mode):
+    if mode == 'sampling':
+        return StackSampler(settings.PROFILE_SAMPLING_INTERVAL)
+    return cProfile.Profile()
+
+
+def get_profile_name(mode, view_name):
+    stamp = timezone.now().strftime('%Y%m%dT%H%M%S%f')
+    return f'{stamp}-{view_name}{EXTENSIONS[mode]}'
+
+
+def list_profiles():
+    """Файлы профилей от новых к старым."""
+    if not os.path.isdir(settings.PROFILE_DIR):
+        return []
+    paths = [
+        os.path.join(settings.PROFILE_DIR, name)
+        for name in os.listdir(settings.PROFILE_DIR)
+        if name.endswith(tuple(EXTENSIONS.values()))
+    ]
+    return sorted(paths, reverse=True)
+
+
+def save_profile(profiler, mode, view_name):
+    """Сохраняет профиль и удаляет старые сверх PROFILE_MAX_FILES."""
+    os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+    name = get_profile_name(mode, view_name)
+    profiler.dump_stats(os.path.join(settings.PROFILE_DIR, name))
+    for path in list_profiles()[settings.PROFILE_MAX_FILES:]:
+        os.remove(path)
+    return name
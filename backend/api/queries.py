@@ -0,0 +1,57 @@
+import logging
+import re
+from collections import Counter
+
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+IN_LISTS = re.compile(r'IN \((?:(?:%s|\?)(?:, )?)+\)')
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def get_fingerprint(sql):
+    """SQL без литералов: одинаковые запросы с разными id совпадают."""
+    sql = LITERALS.sub('?', sql)
+    return IN_LISTS.sub('IN (...)', sql)
+
+
+class QueryCounter:
+    """Считает запросы к базе через execute_wrapper, без DEBUG."""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def get_fingerprints(self):
+        return Counter(get_fingerprint(sql) for sql in self.queries)
+
+
+def report_overage(view_name, action, budget, counter, strict):
+    fingerprints = '\n'.join(
+        f'{count} x {fingerprint}'
+        for fingerprint, count in counter.get_fingerprints().most_common()
+    )
+    message = (f'{view_name}.{action}: {len(counter)} запросов '
+               f'при бюджете {budget}\n{fingerprints}')
+    if strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
@@ -0,0 +1,36 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+
+class PassthroughRenderer(BaseRenderer):
+    """
+    Рендерер для выбора формата через ?format= и заголовок Accept.
+    Ответ формирует сам обработчик, рендерер данные не преобразует.
+    Прочие данные (например, ошибки DRF) сериализуются в JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or isinstance(data, (bytes, str)):
+            return data
+        return JSONRenderer().render(data)
+
+
+class PlainTextRenderer(PassthroughRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(PassthroughRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class JSONStreamRenderer(PassthroughRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+
+class PDFRenderer(PassthroughRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
@@ -1,10 +1,14 @@
-from django.shortcuts import get_object_or_404
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import serializers
 
 from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from users.models import Follow, User
-from .fields import Base64ImageField
+from .fields import Base64ImageField, ImageVariantField
+from .images import submit_variants
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -27,6 +31,9 @@ class UserSerializer(serializers.ModelSerializer):
         if request is not None:
             user = request.user
             if user.is_authenticated:
+                annotated = getattr(obj, 'is_subscribed', None)
+                if annotated is not None:
+                    return annotated
                 return Follow.objects.filter(user=user, author=obj).exists()
             else:
                 return False
@@ -58,6 +65,8 @@ class CustomSetPasswordSerializer(SetPasswordSerializer):
 
 
 class RecipesSubscribeSerializer(serializers.ModelSerializer):
+    image_small = ImageVariantField()
+    image_medium = ImageVariantField()
 
     class Meta:
         model = Recipe
@@ -65,12 +74,13 @@ class RecipesSubscribeSerializer(serializers.ModelSerializer):
             'id',
             'name',
             'image',
+            'image_small',
+            'image_medium',
             'cooking_time',
         )
 
 
 class SubscribeSerializer(serializers.ModelSerializer):
-    recipes_count = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
     is_subscribed = serializers.SerializerMethodField()
 
@@ -87,10 +97,10 @@ class SubscribeSerializer(serializers.ModelSerializer):
             'recipes_count',
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_is_subscribed(self, obj):
+        is_subscribed = getattr(obj, 'is_subscribed', None)
+        if is_subscribed is not None:
+            return is_subscribed
         request = self.context.get('request')
         user = request.user
         if user.is_authenticated:
@@ -98,12 +108,14 @@ class SubscribeSerializer(serializers.ModelSerializer):
         return False
 
     def get_recipes(self, obj):
-        recipes_limit = self.context.get('recipes_limit')
-        if recipes_limit is not None:
-            recipes_limit = int(self.context.get('recipes_limit'))
-            queryset = Recipe.objects.filter(author=obj)[:recipes_limit]
-        else:
-            queryset = Recipe.objects.filter(author=obj)
+        queryset = getattr(obj, 'preview_recipes', None)
+        if queryset is None:
+            recipes_limit = self.context.get('recipes_limit')
+            if recipes_limit is not None:
+                recipes_limit = int(self.context.get('recipes_limit'))
+                queryset = Recipe.objects.filter(author=obj)[:recipes_limit]
+            else:
+                queryset = Recipe.objects.filter(author=obj)
         serializer = RecipesSubscribeSerializer(queryset, many=True)
         return serializer.data
 
@@ -182,6 +194,8 @@ class RecipesSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_small = ImageVariantField()
+    image_medium = ImageVariantField()
 
     class Meta:
         model = Recipe
@@ -194,29 +208,37 @@ class RecipesSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_small',
+            'image_medium',
             'text',
             'cooking_time',
+            'favorites_count',
         )
 
-    def get_is_favorited(self, obj):
+    def get_user_flag(self, obj, flag, related_name):
+        """
+        Возвращает флаг, посчитанный во вьюсете аннотацией,
+        иначе проверяет связь отдельным запросом.
+        """
         request = self.context.get('request')
         if request is not None:
             user = request.user
             if user.is_authenticated:
-                return obj.favorited.filter(id=user.id).exists()
+                annotated = getattr(obj, flag, None)
+                if annotated is not None:
+                    return annotated
+                return getattr(obj, related_name).filter(
+                    id=user.id).exists()
             else:
                 return False
         return False
 
+    def get_is_favorited(self, obj):
+        return self.get_user_flag(obj, 'is_favorited', 'favorited')
+
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        if request is not None:
-            user = request.user
-            if user.is_authenticated:
-                return obj.shopping_cart.filter(id=user.id).exists()
-            else:
-                return False
-        return False
+        return self.get_user_flag(
+            obj, 'is_in_shopping_cart', 'shopping_cart')
 
 
 class RecipesPostSerializer(serializers.ModelSerializer):
@@ -245,37 +267,118 @@ class RecipesPostSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         ingredients = data.get('recipes_ingredient')
+        if ingredients is None:
+            return data
         ids = [i['ingredient'].get('id') for i in ingredients]
         if len(ids) != len(set(ids)):
             raise serializers.ValidationError(
                 'Дублирование ингредиентов'
             )
+        missing = set(ids) - set(Ingredient.objects.in_bulk(ids))
+        if missing:
+            raise serializers.ValidationError({
+                'ingredients': [
+                    f'Ингредиент с id={pk} не существует'
+                    for pk in sorted(missing)
+                ]
+            })
         return data
 
     def nested_ingredients_save(self, ingredients, object):
-        for ingredient_note in ingredients:
-            id_ingredient = ingredient_note['ingredient'].get('id')
-            amount = ingredient_note.get('amount')
-            current_ingredient = get_object_or_404(
-                Ingredient, id=id_ingredient)
-            object.ingredients.add(
-                current_ingredient, through_defaults={'amount': amount})
+        """
+        Сохраняет ингредиенты рецепта одним запросом.
+        Существование ингредиентов проверено в validate.
+        """
+        if not ingredients:
+            return
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                reciepe=object,
+                ingredient_id=ingredient_note['ingredient'].get('id'),
+                amount=ingredient_note.get('amount'),
+            )
+            for ingredient_note in ingredients
+        )
+
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            # Временный файл декодированного изображения.
+            image = self.validated_data.get('image')
+            if image:
+                image.close()
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('recipes_ingredient')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
-        RecipesPostSerializer.nested_ingredients_save(
-            self, ingredients, recipe)
-        for tag in tags:
-            recipe.tags.add(tag)
+        self.nested_ingredients_save(ingredients, recipe)
+        recipe.tags.set(tags)
+        self.schedule_image_variants(recipe, validated_data)
         return recipe
 
+    def nested_ingredients_update(self, ingredients, object):
+        """
+        Приводит ингредиенты рецепта к переданному набору:
+        создаёт новые, меняет количество у изменившихся
+        и удаляет лишние. Неизменённые строки не трогает.
+        """
+        existing = {
+            note.ingredient_id: note
+            for note in object.recipes_ingredient.all()
+        }
+        submitted = {
+            note['ingredient'].get('id'): note.get('amount')
+            for note in ingredients
+        }
+        changed = []
+        for ingredient_id, amount in submitted.items():
+            note = existing.get(ingredient_id)
+            if note is not None and note.amount != amount:
+                note.amount = amount
+                changed.append(note)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        removed = existing.keys() - submitted.keys()
+        if removed:
+            object.recipes_ingredient.filter(
+                ingredient_id__in=removed).delete()
+        self.nested_ingredients_save(
+            [note for note in ingredients
+             if note['ingredient'].get('id') not in existing],
+            object
+        )
+
+    @transaction.atomic
     def update(self, instance, validated_data):
-        ingredients = validated_data.pop('recipes_ingredient')
-        tags = validated_data.pop('tags')
-        instance.ingredients.clear()
-        RecipesPostSerializer.nested_ingredients_save(
-            self, ingredients, instance)
-        instance.tags.set(tags)
-        return super().update(instance, validated_data)
+        ingredients = validated_data.pop('recipes_ingredient', None)
+        tags = validated_data.pop('tags', None)
+        if ingredients is not None:
+            self.nested_ingredients_update(ingredients, instance)
+        if tags is not None:
+            # set() сам сравнивает наборы и не пишет в базу без изменений.
+            instance.tags.set(tags)
+        if validated_data.get('image'):
+            # Копии прежнего изображения больше не подходят.
+            validated_data.update(image_small='', image_medium='')
+        instance = super().update(instance, validated_data)
+        self.schedule_image_variants(instance, validated_data)
+        return instance
+
+    def schedule_image_variants(self, recipe, validated_data):
+        if validated_data.get('image') and recipe.image:
+            transaction.on_commit(
+                partial(submit_variants, recipe.image.name))
+
+    def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            Prefetch(
+                'recipes_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            'tags',
+        )
+        return super().to_representation(instance)
@@ -0,0 +1,75 @@
+import csv
+import json
+
+from django.db.models import F, Sum
+from django.http import StreamingHttpResponse
+
+from recipes.models import RecipeIngredient
+
+CONTENT_TYPES = {
+    'txt': 'text/plain; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'json': 'application/json',
+}
+
+
+def get_shopping_list(user):
+    """
+    Суммирует ингредиенты рецептов из списка покупок пользователя
+    одним запросом с группировкой по ингредиенту.
+    """
+    return RecipeIngredient.objects.filter(
+        reciepe__shopping_cart=user,
+    ).values(
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).annotate(
+        amount=Sum('amount'),
+    ).order_by('name', 'measurement_unit')
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def iter_txt(rows):
+    for row in rows:
+        yield '{name} ({measurement_unit}) — {amount:g}\n'.format(**row)
+
+
+def iter_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for row in rows:
+        yield writer.writerow(
+            (row['name'], row['measurement_unit'], f'{row["amount"]:g}'))
+
+
+def iter_json(rows):
+    separator = ''
+    yield '['
+    for row in rows:
+        yield separator + json.dumps(row, ensure_ascii=False)
+        separator = ', '
+    yield ']'
+
+
+ITERATORS = {
+    'txt': iter_txt,
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+
+def stream_shopping_list(shopping_list, file_format):
+    """Отдает список покупок потоком в текстовом формате."""
+    response = StreamingHttpResponse(
+        ITERATORS[file_format](shopping_list.iterator()),
+        content_type=CONTENT_TYPES[file_format],
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="shopping_list.{file_format}"')
+    return response
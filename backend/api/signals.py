@@ -0,0 +1,135 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from core.counters import change_counter
+from core.versions import bump_version
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Favorite, ShoppingCart, User
+from .cache import invalidate_response_cache
+from .catalog import ingredient_catalog, tag_slugs
+from .feed import fan_out_recipe
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_changed(sender, **kwargs):
+    """Сбрасывает справочник ингредиентов в памяти."""
+    ingredient_catalog.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_changed(sender, **kwargs):
+    """Сбрасывает слаги тегов в памяти."""
+    tag_slugs.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def versioned_model_changed(sender, **kwargs):
+    """Увеличивает версию модели для ETag и кэшей."""
+    bump_version(sender)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    invalidate_response_cache('recipes', [instance.pk])
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, instance, created, **kwargs):
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+        fan_out_recipe(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+# Счетчики рецепта, которые ведут связи пользователей с ним.
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+def relation_saving(sender, instance, **kwargs):
+    """Запоминает прежний рецепт связи, измененной в админке."""
+    if instance.pk is not None:
+        instance.previous_recipe_id = sender.objects.filter(
+            pk=instance.pk).values_list('recipe_id', flat=True).first()
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def relation_saved(sender, instance, created, **kwargs):
+    counter = RELATION_COUNTERS[sender]
+    previous = getattr(instance, 'previous_recipe_id', None)
+    if not created and previous == instance.recipe_id:
+        return
+    if previous is not None:
+        change_counter(Recipe, previous, counter, -1)
+        invalidate_response_cache('recipes', [previous])
+    change_counter(Recipe, instance.recipe_id, counter, 1)
+    invalidate_response_cache('recipes', [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def relation_deleted(sender, instance, **kwargs):
+    """Сюда же приходят remove() и clear() связей пользователя."""
+    change_counter(Recipe, instance.recipe_id, RELATION_COUNTERS[sender], -1)
+    invalidate_response_cache('recipes', [instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Favorite)
+@receiver(m2m_changed, sender=ShoppingCart)
+def relation_added(sender, instance, action, pk_set, **kwargs):
+    """add() вставляет связи через bulk_create, минуя post_save."""
+    if action != 'post_add' or not pk_set:
+        return
+    counter = RELATION_COUNTERS[sender]
+    if isinstance(instance, Recipe):
+        change_counter(Recipe, instance.pk, counter, len(pk_set))
+        return
+    for recipe_id in pk_set:
+        change_counter(Recipe, recipe_id, counter, 1)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    invalidate_response_cache('recipes', [instance.reciepe_id])
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def recipe_related_changed(sender, **kwargs):
+    """Теги и ингредиенты входят в ответ любого рецепта."""
+    invalidate_response_cache('recipes')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=User.is_favorited.through)
+@receiver(m2m_changed, sender=User.is_in_shopping_cart.through)
+def recipe_relation_changed(sender, instance, action, reverse, pk_set,
+                            **kwargs):
+    """Сбрасывает кэш рецептов, у которых изменились связи."""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if isinstance(instance, Recipe):
+        invalidate_response_cache('recipes', [instance.pk])
+    elif pk_set is not None:
+        invalidate_response_cache('recipes', pk_set)
+    else:
+        invalidate_response_cache('recipes')
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+
+PAGE_SIZES = (1, 100)
+
+
+def assert_queries_independent_of_page_size(testcase, client, url, data=None,
+                                            sizes=PAGE_SIZES):
+    """
+    Запрашивает страницы размером sizes и проверяет, что число
+    запросов к базе одинаково. Данных должно хватать на самую
+    большую страницу, иначе проверка ничего не доказывает.
+    """
+    counts = {}
+    for size in sizes:
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, data={**(data or {}), 'limit': size})
+        testcase.assertEqual(status.HTTP_200_OK, response.status_code)
+        testcase.assertEqual(size, len(response.data['results']))
+        counts[size] = context.captured_queries
+    first, *others = counts.values()
+    for size, queries in zip(sizes[1:], others):
+        testcase.assertEqual(
+            len(first), len(queries),
+            f'Запросов на странице из {sizes[0]}: {len(first)}, '
+            f'из {size}: {len(queries)}\n'
+            + '\n'.join(query['sql'] for query in queries))
+    return response
+
+
+@contextmanager
+def capture_on_commit_callbacks(execute=True):
+    """
+    Собирает transaction.on_commit, зарегистрированные в блоке:
+    в TestCase транзакция не фиксируется и они иначе не вызываются.
+    """
+    callbacks = []
+    start = len(connection.run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        callbacks[:] = [
+            callback for _, callback in connection.run_on_commit[start:]]
+        if execute:
+            for callback in callbacks:
+                callback()
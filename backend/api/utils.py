@@ -2,8 +2,6 @@ import os
 from io import BytesIO
 
 from django.conf import settings
-from django.http import HttpResponse
-from django.template.loader import get_template
 from xhtml2pdf import pisa
 
 
@@ -19,13 +17,11 @@ def fetch_pdf_resources(uri, rel):
     return path
 
 
-def html_to_pdf(template_src, context_dict={}):
-    template = get_template(template_src)
-    html = template.render(context_dict)
+def html_to_pdf(html):
     result = BytesIO()
     pdf = pisa.pisaDocument(BytesIO(html.encode("UTF-8")), result,
                             encoding='utf-8',
                             link_callback=fetch_pdf_resources)
     if not pdf.err:
-        return HttpResponse(result.getvalue(), content_type='application/pdf')
+        return result.getvalue()
     return None
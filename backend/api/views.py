@@ -1,28 +1,111 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, OuterRef, Prefetch,
+                              Subquery, Value)
+from django.http import FileResponse, JsonResponse
 from django.shortcuts import get_object_or_404
-from recipes.models import Ingredient, Recipe, Tag
+from django.urls import reverse
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
 from rest_framework import filters, permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-from users.models import Follow, User
+from users.models import FeedEntry, Favorite, Follow, ShoppingCart, User
 
-from .filters import CustomSearchFilter
-from .mixins import (CreateListRetrieveDelUpdFovoriteViewSet,
-                     CreateListRetrieveViewSet)
-from .pagination import PageLimitPagination
+from .catalog import ingredient_catalog
+from .feed import backfill_feed, trim_feed
+from .filters import RECIPE_ORDERINGS, IngredientSearchFilter
+from .mixins import (AnonymousCacheMixin,
+                     CreateListRetrieveDelUpdFovoriteViewSet,
+                     CreateListRetrieveViewSet, CursorPaginationMixin,
+                     IngredientCatalogMixin, ProfilingMixin,
+                     QueryBudgetMixin, ServerTimingMixin,
+                     VersionedETagMixin)
+from .pagination import (CursorLimitPagination, PageLimitPagination,
+                         UserCursorLimitPagination)
+from .pdf import get_pdf_path, get_pdf_status, submit_pdf
 from .permissions import AuthForItemOrReadOnly
+from .renderers import (CSVRenderer, JSONStreamRenderer, PDFRenderer,
+                        PlainTextRenderer)
 from .serializers import (CustomSetPasswordSerializer, IngredientSerializer,
                           RecipesPostSerializer, RecipesSerializer,
                           SubscribeSerializer, TagSerializer,
                           UserPostSerializer, UserSerializer)
-from .utils import html_to_pdf
+from .shopping_list import get_shopping_list, stream_shopping_list
 
 
-class CustomUserViewSet(CreateListRetrieveViewSet):
+def annotate_recipe_flags(queryset, user):
+    """Добавляет к рецептам флаги избранного и списка покупок."""
+    if not user.is_authenticated:
+        return queryset
+    favorited = Favorite.objects.filter(recipe=OuterRef('pk'), user=user)
+    in_shopping_cart = ShoppingCart.objects.filter(
+        recipe=OuterRef('pk'), user=user)
+    return queryset.annotate(
+        is_favorited=Exists(favorited),
+        is_in_shopping_cart=Exists(in_shopping_cart),
+    )
+
+
+def annotate_is_subscribed(queryset, user):
+    """Добавляет к пользователям флаг подписки текущего пользователя."""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(is_subscribed=Exists(
+        Follow.objects.filter(user=user, author=OuterRef('pk'))))
+
+
+def optimize_recipes_queryset(queryset, user):
+    """
+    Подгружает автора, теги и ингредиенты рецептов фиксированным
+    числом запросов независимо от количества рецептов.
+    """
+    authors = annotate_is_subscribed(User.objects.all(), user)
+    ingredients = RecipeIngredient.objects.select_related('ingredient')
+    return annotate_recipe_flags(queryset, user).prefetch_related(
+        Prefetch('author', queryset=authors),
+        Prefetch('recipes_ingredient', queryset=ingredients),
+        'tags',
+    )
+
+
+def optimize_subscriptions_queryset(queryset, recipes_limit=None):
+    """
+    Подгружает первые recipes_limit рецептов каждого автора
+    в подписках одним запросом, число рецептов берется из recipes_count.
+    """
+    recipes = Recipe.objects.all()
+    if recipes_limit is not None:
+        latest = Recipe.objects.filter(
+            author=OuterRef('author')).values('id')[:recipes_limit]
+        recipes = recipes.filter(id__in=Subquery(latest))
+    return queryset.annotate(
+        is_subscribed=Value(True, output_field=BooleanField()),
+    ).prefetch_related(
+        Prefetch('recipes', queryset=recipes, to_attr='preview_recipes'))
+
+
+class CustomUserViewSet(ProfilingMixin, QueryBudgetMixin, ServerTimingMixin,
+                        CursorPaginationMixin, CreateListRetrieveViewSet):
     serializer_class = UserSerializer
     queryset = User.objects.all()
     permission_classes = (AuthForItemOrReadOnly,)
+    cursor_pagination_class = UserCursorLimitPagination
+    # С учетом запроса токена при TokenAuthentication.
+    query_budgets = {
+        'list': 4,
+        'retrieve': 3,
+        'create': 5,
+        'me_path': 3,
+        'set_password': 4,
+        'subscribe': 10,
+        'subscriptions': 6,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('retrieve', 'list'):
+            return annotate_is_subscribed(queryset, self.request.user)
+        return queryset
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -45,6 +128,12 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.GET.get('recipes_limit')
+        if recipes_limit is not None and recipes_limit.isdigit():
+            return int(recipes_limit)
+        return None
+
     @action(
         ["post"],
         detail=False,
@@ -72,15 +161,22 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
                     user=user,
                     author=recipe_author).exists() or user == recipe_author:
                 return Response(status=status.HTTP_400_BAD_REQUEST)
-            Follow.objects.create(user=user, author=recipe_author)
-            serializer = SubscribeSerializer(
-                recipe_author, context={'request': request})
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=recipe_author)
+                backfill_feed(user.id, recipe_author.id)
+            recipe_author = optimize_subscriptions_queryset(
+                User.objects.filter(id=recipe_author.id),
+                self.get_recipes_limit()).get()
+            serializer = self.get_serializer(recipe_author)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == "DELETE":
             if not Follow.objects.filter(
                     user=user, author=recipe_author).exists():
                 return Response(status=status.HTTP_400_BAD_REQUEST)
-            Follow.objects.filter(user=user, author=recipe_author).delete()
+            with transaction.atomic():
+                Follow.objects.filter(
+                    user=user, author=recipe_author).delete()
+                trim_feed(user.id, recipe_author.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -91,60 +187,172 @@ class CustomUserViewSet(CreateListRetrieveViewSet):
     )
     def subscriptions(self, request):
         user = request.user
-        recipes_limit = request.GET.get('recipes_limit')
-        queryset = self.queryset.filter(following__user=user)
+        queryset = optimize_subscriptions_queryset(
+            self.queryset.filter(following__user=user),
+            self.get_recipes_limit())
         page = self.paginate_queryset(queryset)
         if page is not None:
-            serializer = self.get_serializer(page, many=True, context={
-                                             'request': request,
-                                             'recipes_limit': recipes_limit})
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
-        serializer = SubscribeSerializer(queryset, many=True, context={
-                                         'request': request,
-                                         'recipes_limit': recipes_limit})
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
 
-class RecipesViewSet(CreateListRetrieveDelUpdFovoriteViewSet):
+class RecipesViewSet(ProfilingMixin, QueryBudgetMixin, ServerTimingMixin,
+                     AnonymousCacheMixin, CursorPaginationMixin,
+                     CreateListRetrieveDelUpdFovoriteViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipesSerializer
+    cache_prefix = 'recipes'
+    query_budgets = {
+        'list': 8,
+        'retrieve': 6,
+        'create': 15,
+        'update': 20,
+        'partial_update': 20,
+        'destroy': 12,
+        'favorite': 8,
+        'shopping_cart': 8,
+        'download_shopping_cart': 3,
+        'download_shopping_cart_pdf': 3,
+        'feed': 8,
+    }
 
-    def get_serializer_class(self):
+    def get_queryset(self):
+        queryset = super().get_queryset()
         if self.action in ('retrieve', 'list'):
+            return optimize_recipes_queryset(queryset, self.request.user)
+        return queryset
+
+    def get_serializer_class(self):
+        if self.action in ('retrieve', 'list', 'feed'):
             return RecipesSerializer
         return RecipesPostSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def use_cursor_pagination(self):
+        """
+        Курсор DRF хранит позицию только по первому полю порядка.
+        Счетчики popular и trending меняются и часто совпадают,
+        поэтому для них всегда постраничная пагинация.
+        """
+        if self.request.query_params.get('ordering') in RECIPE_ORDERINGS:
+            return False
+        return super().use_cursor_pagination()
+
     @action(
         ["get"],
         detail=False,
         permission_classes=(permissions.IsAuthenticated,),
     )
+    def feed(self, request):
+        """
+        Рецепты авторов из подписок: курсорная пагинация по ленте
+        пользователя, затем рецепты страницы одним запросом.
+        """
+        paginator = CursorLimitPagination()
+        entries = paginator.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).only(
+                'id', 'recipe_id', 'pub_date'),
+            request, view=self)
+        recipes = optimize_recipes_queryset(
+            Recipe.objects.all(), request.user).in_bulk(
+            [entry.recipe_id for entry in entries])
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in entries
+             if entry.recipe_id in recipes], many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    def handle_exception(self, exc):
+        """
+        Ошибки выгрузки списка покупок отдаются в JSON: рендереры
+        форматов файла не преобразуют данные ответа.
+        """
+        response = super().handle_exception(exc)
+        if self.action == 'download_shopping_cart':
+            self.request.accepted_renderer = JSONRenderer()
+            self.request.accepted_media_type = JSONRenderer.media_type
+        return response
+
+    @action(
+        ["get"],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer,
+                          JSONStreamRenderer, PDFRenderer),
+    )
     def download_shopping_cart(self, request):
-        user = request.user
-        users_recipes = Recipe.objects.filter(shopping_cart=user)
-        data = Ingredient.objects.filter(
-            recipes__in=users_recipes).values(
-                'name', 'measurement_unit').annotate(
-                    amount=Sum('ingredients_recipe__amount')
-        )
-        data_dict = {'data': data}
-        pdf = html_to_pdf('spisok_template.html', data_dict)
-        return HttpResponse(pdf, content_type='application/pdf')
-
-
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+        shopping_list = get_shopping_list(request.user)
+        file_format = request.accepted_renderer.format
+        if file_format == 'pdf':
+            job_id = submit_pdf(request.user, shopping_list)
+            return self.get_pdf_response(request.user, job_id)
+        return stream_shopping_list(shopping_list, file_format)
+
+    @action(
+        ["get"],
+        detail=False,
+        permission_classes=(permissions.IsAuthenticated,),
+        url_path=r'download_shopping_cart/(?P<job_id>[0-9a-f]{64})',
+        url_name='download-shopping-cart-pdf',
+    )
+    def download_shopping_cart_pdf(self, request, job_id):
+        return self.get_pdf_response(request.user, job_id)
+
+    def get_pdf_response(self, user, job_id):
+        """
+        Отдает готовый PDF из кэша или статус задачи на его сборку.
+        """
+        pdf_status = get_pdf_status(user, job_id)
+        if pdf_status == 'ready':
+            return FileResponse(
+                open(get_pdf_path(user.id, job_id), 'rb'),
+                as_attachment=True,
+                filename='shopping_list.pdf',
+                content_type='application/pdf',
+            )
+        if pdf_status is None:
+            return JsonResponse(
+                {'detail': 'Задача не найдена'},
+                status=status.HTTP_404_NOT_FOUND)
+        if pdf_status == 'failed':
+            return JsonResponse(
+                {'job_id': job_id, 'status': pdf_status},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        location = reverse(
+            'api:recipes-download-shopping-cart-pdf',
+            kwargs={'job_id': job_id})
+        response = JsonResponse(
+            {'job_id': job_id, 'status': pdf_status},
+            status=status.HTTP_202_ACCEPTED)
+        response['Location'] = location
+        return response
+
+
+class IngredientViewSet(ProfilingMixin, QueryBudgetMixin, ServerTimingMixin,
+                        VersionedETagMixin, IngredientCatalogMixin,
+                        viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (CustomSearchFilter, filters.OrderingFilter)
-    search_fields = ('^name',)
+    filter_backends = (filters.OrderingFilter, IngredientSearchFilter)
+    etag_models = (Ingredient,)
+    query_budgets = {'list': 3, 'retrieve': 3}
     ordering = ('name',)
     lookup_url_kwarg = 'id'
 
+    def get_etag_versions(self):
+        if self.use_catalog():
+            ingredient_catalog.get()
+            return [(ingredient_catalog.version, ingredient_catalog.updated)]
+        return super().get_etag_versions()
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ProfilingMixin, QueryBudgetMixin, ServerTimingMixin,
+                 VersionedETagMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    etag_models = (Tag,)
+    query_budgets = {'list': 3, 'retrieve': 3}
     lookup_url_kwarg = 'id'
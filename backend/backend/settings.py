@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +87,29 @@ if 'test' in sys.argv or 'test\_coverage' in sys.argv: #Covers regular testing a
     DATABASES['default']['ENGINE'] = 'django.db.backends.sqlite3'
     DATABASES['default']['NAME'] = ':memory:'
 
+# Превышение query_budgets роняет запрос в тестах, в работе - только лог.
+QUERY_BUDGET_STRICT = os.getenv(
+    'QUERY_BUDGET_STRICT', str('test' in sys.argv)) == 'True'
+
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+    }
+}
+
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+STATS_ALLOWED_IPS = os.getenv('STATS_ALLOWED_IPS', '127.0.0.1').split(',')
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(BASE_DIR, 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.getenv('PROFILE_SAMPLE_RATE', 0))
+PROFILE_SAMPLING_INTERVAL = 0.005
+PROFILE_MAX_FILES = int(os.getenv('PROFILE_MAX_FILES', 500))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -146,3 +170,32 @@ CORS_ORIGIN_ALLOW_ALL = False
 CORS_URLS_REGEX = r'^/api/.*$'
 
 CSV_FILE_PATH = os.path.join(BASE_DIR, './data/ingredients.csv')
+
+SHOPPING_CART_PDF_ROOT = os.getenv(
+    'SHOPPING_CART_PDF_ROOT', os.path.join(BASE_DIR, 'pdf_cache'))
+PDF_RENDER_WORKERS = int(os.getenv('PDF_RENDER_WORKERS', 2))
+PDF_RENDER_TIMEOUT = 60
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+# base64 занимает на треть больше исходного файла.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_SIZE * 4 // 3 + 1024 * 1024
+IMAGE_VARIANTS = {
+    'small': (200, 200),
+    'medium': (600, 600),
+    'full': (1600, 1600),
+}
+IMAGE_VARIANT_FORMAT = 'WEBP'
+IMAGE_VARIANT_QUALITY = 80
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+
+INGREDIENT_SEARCH_BACKEND = os.getenv('INGREDIENT_SEARCH_BACKEND', 'database')
+
+# ?ordering=trending: окно и период полураспада для update_trending.
+TRENDING_WINDOW_HOURS = float(os.getenv('TRENDING_WINDOW_HOURS', 7 * 24))
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+
+# Сколько последних рецептов автора попадает в ленту при подписке.
+FEED_BACKFILL_SIZE = int(os.getenv('FEED_BACKFILL_SIZE', 100))
+INGREDIENT_CATALOG_CHECK_INTERVAL = 5
@@ -3,9 +3,14 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import metrics, stats
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    # Не проксируются nginx, читаются с самого backend.
+    path('stats/', stats, name='stats'),
+    path('metrics', metrics, name='metrics'),
 ]
 
 if settings.DEBUG:
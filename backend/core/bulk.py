@@ -0,0 +1,62 @@
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+
+
+def insert_rows(model, fields, rows, returning=False,
+                ignore_conflicts=False):
+    """
+    Многострочный INSERT без создания экземпляров моделей:
+    на больших объемах сборка SQL в bulk_create обходится дороже самой
+    вставки. Значения должны быть уже приведены к формату базы,
+    остальные поля заполняются значениями по умолчанию.
+    """
+    if not rows:
+        return []
+    opts, ops = model._meta, connection.ops
+    columns = [opts.get_field(field).column for field in fields]
+    defaults = []
+    for field in opts.concrete_fields:
+        if field.primary_key or field.name in fields:
+            continue
+        if getattr(field, 'auto_now_add', False):
+            value = timezone.now()
+        else:
+            value = field.get_default()
+        columns.append(field.column)
+        defaults.append(field.get_db_prep_save(value, connection))
+    if defaults:
+        rows = [list(row) + defaults for row in rows]
+    sql = '{} {} ({}) VALUES '.format(
+        ops.insert_statement(ignore_conflicts=ignore_conflicts),
+        ops.quote_name(opts.db_table),
+        ', '.join(ops.quote_name(column) for column in columns),
+    )
+    suffix = ops.ignore_conflicts_suffix_sql(ignore_conflicts=ignore_conflicts)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            from psycopg2.extras import execute_values
+            returning_sql = (
+                f' RETURNING {ops.quote_name(opts.pk.column)}'
+                if returning else '')
+            result = execute_values(
+                cursor.cursor, f'{sql}%s {suffix}{returning_sql}', rows,
+                page_size=1000, fetch=returning)
+            return [row[0] for row in result or []]
+        placeholders = ', '.join(['%s'] * len(columns))
+        cursor.executemany(f'{sql}({placeholders}) {suffix}', rows)
+    return []
+
+
+def insert_rows_returning_ids(model, fields, rows):
+    """
+    insert_rows с получением id новых строк. Если база не умеет
+    RETURNING, id назначаются заранее; вызывать внутри транзакции.
+    """
+    if connection.features.can_return_ids_from_bulk_insert:
+        return insert_rows(model, fields, rows, returning=True)
+    last_id = model.objects.aggregate(Max('pk'))['pk__max'] or 0
+    ids = list(range(last_id + 1, last_id + 1 + len(rows)))
+    insert_rows(model, [model._meta.pk.name] + list(fields), [
+        [pk] + list(row) for pk, row in zip(ids, rows)])
+    return ids
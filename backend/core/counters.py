@@ -0,0 +1,43 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Recipe
+from users.models import Favorite, ShoppingCart, User
+
+# Счетчик: модель, поле, связанная модель и ее ссылка на модель счетчика.
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    """Меняет счетчик одним UPDATE с F(), не опускаясь ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)})
+
+
+def get_actual_count(related_model, key):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{key: OuterRef('pk')}).order_by()
+        .values(key).annotate(count=Count('pk')).values('count')
+    ), 0)
+
+
+def reconcile_counters(dry_run=False):
+    """
+    Пересчитывает счетчики, разошедшиеся с данными.
+    Возвращает число исправленных (при dry_run - найденных) строк.
+    """
+    result = {}
+    for model, field, related_model, key in COUNTERS:
+        actual = get_actual_count(related_model, key)
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')})
+        if dry_run:
+            result[field] = drifted.count()
+        else:
+            result[field] = model.objects.filter(
+                pk__in=drifted.values('pk')).update(**{field: actual})
+    return result
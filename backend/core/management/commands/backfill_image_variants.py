@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from api.images import (FULL_VARIANT, get_variant_format,
+                        render_recipe_variants)
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий изображений существующих рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии, даже если они уже есть')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['force']:
+            _, ext = get_variant_format()
+            recipes = recipes.filter(
+                Q(image_small='') | Q(image_medium='')
+                | ~Q(image__endswith=f'_{FULL_VARIANT}.{ext}'))
+        names = recipes.order_by().values_list('image', flat=True).distinct()
+        done = failed = 0
+        for name in names.iterator():
+            try:
+                render_recipe_variants(name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+            else:
+                done += 1
+        self.stdout.write(
+            f'Обработано изображений: {done}, с ошибками: {failed}')
@@ -0,0 +1,64 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import IngredientSearchFilter
+from recipes.models import Ingredient
+
+ALPHABET = 'абвгдеёжзийклмнопрстуфхцчшщыэюя'
+
+
+def make_name(rng):
+    words = (
+        ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 10)))
+        for _ in range(rng.randint(1, 3))
+    )
+    return ' '.join(words)
+
+
+class Command(BaseCommand):
+    help = ('Замер поиска ингредиентов на синтетическом каталоге. '
+            'Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            # Номер делает пары (name, measurement_unit) уникальными.
+            names = [f'{make_name(rng)} {number}'
+                     for number in range(options['size'])]
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=name, name_lower=name, measurement_unit='г')
+                 for name in names),
+                batch_size=500,
+            )
+            with connection.cursor() as cursor:
+                if connection.vendor == 'postgresql':
+                    cursor.execute('ANALYZE recipes_ingredient')
+            search = IngredientSearchFilter()
+            factory = RequestFactory()
+            timings = []
+            for _ in range(options['queries']):
+                term = rng.choice(names)[:rng.randint(1, 4)]
+                request = Request(factory.get('/', {'name': term}))
+                queryset = search.filter_queryset(
+                    request, Ingredient.objects.all(), None)
+                started = time.perf_counter()
+                list(queryset.values_list('id', flat=True))
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(queryset.explain())
+            transaction.set_rollback(True)
+        timings.sort()
+        self.stdout.write(
+            f'{options["size"]} ингредиентов, {len(timings)} запросов: '
+            f'p50 {statistics.median(timings):.2f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} мс')
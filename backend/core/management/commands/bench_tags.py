@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.http import QueryDict
+from django.test import RequestFactory
+from rest_framework.request import Request
+
+from api.filters import RecipeFilter
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = ('Замер фильтрации рецептов по 1-10 тегам на синтетических '
+            'данных. Данные создаются в транзакции и откатываются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        with transaction.atomic():
+            author = User.objects.create(
+                username='bench_tags', email='bench_tags@example.com')
+            Tag.objects.bulk_create(
+                Tag(name=f'bench_{number}', color='#000000',
+                    slug=f'bench_{number}')
+                for number in range(10)
+            )
+            tags = list(Tag.objects.filter(slug__startswith='bench_'))
+            Recipe.objects.bulk_create(
+                (Recipe(name=f'recipe_{number}', text='text',
+                        cooking_time=1, author=author)
+                 for number in range(options['recipes'])),
+                batch_size=500,
+            )
+            Recipe.tags.through.objects.bulk_create(
+                (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+                 for recipe_id in author.recipes.values_list('id', flat=True)
+                 for tag in rng.sample(tags, rng.randint(1, 3))),
+                batch_size=500,
+            )
+            request = Request(RequestFactory().get('/'))
+            request.user = author
+            for size in range(1, len(tags) + 1):
+                data = QueryDict(mutable=True)
+                data.setlist('tags', [tag.slug for tag in tags[:size]])
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    queryset = RecipeFilter(
+                        data, Recipe.objects.all(), request=request).qs
+                    count = queryset.count()
+                    ids = list(queryset.values_list('id', flat=True)[:6])
+                    timings.append((time.perf_counter() - started) * 1000)
+                if len(ids) != len(set(ids)):
+                    raise CommandError(f'Дубли в выдаче по {size} тегам')
+                self.stdout.write(
+                    f'тегов {size:2}: найдено {count}, '
+                    f'p50 {statistics.median(timings):.2f} мс, '
+                    f'max {max(timings):.2f} мс')
+            transaction.set_rollback(True)
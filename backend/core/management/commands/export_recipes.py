@@ -0,0 +1,103 @@
+import json
+import sys
+import time
+from collections import defaultdict
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Favorite, Follow, ShoppingCart, User
+
+# Даты выгружаются с микросекундами, чтобы сохранить порядок рецептов.
+encoder = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'),
+                           default=lambda value: value.isoformat())
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = ('Потоковая выгрузка рецептов, ингредиентов, тегов, '
+            'избранного, списков покупок и подписок в NDJSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл для выгрузки, по умолчанию stdout')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.chunk_size = options['chunk_size']
+        started = time.perf_counter()
+        if options['path'] == '-':
+            counts = self.export(sys.stdout)
+        else:
+            with open(options['path'], 'w', encoding='utf8') as file:
+                counts = self.export(file)
+        elapsed = time.perf_counter() - started
+        summary = ', '.join(f'{key}: {value}' for key, value in counts.items())
+        self.stderr.write(
+            f'Выгружено {summary}. '
+            f'{counts["recipe"] / elapsed if elapsed else 0:.0f} рецептов/с '
+            f'({elapsed:.2f} с)'
+        )
+
+    def write_rows(self, file, type, rows):
+        count = 0
+        for row in rows:
+            row['type'] = type
+            file.write(encoder.encode(row))
+            file.write('\n')
+            count += 1
+        return count
+
+    def export(self, file):
+        counts = {}
+        counts['user'] = self.write_rows(file, 'user', User.objects.order_by(
+            'id').values('id', 'email', 'username', 'first_name',
+                         'last_name').iterator(self.chunk_size))
+        counts['tag'] = self.write_rows(file, 'tag', Tag.objects.order_by(
+            'id').values('id', 'name', 'color', 'slug').iterator())
+        counts['ingredient'] = self.write_rows(
+            file, 'ingredient', Ingredient.objects.order_by('id').values(
+                'id', 'name', 'measurement_unit').iterator(self.chunk_size))
+        counts['recipe'] = self.write_rows(file, 'recipe', self.iter_recipes())
+        for type, model, fields in (
+            ('favorite', Favorite, ('user', 'recipe', 'pub_date')),
+            ('shopping_cart', ShoppingCart, ('user', 'recipe')),
+            ('follow', Follow, ('user', 'author', 'pub_date')),
+        ):
+            counts[type] = self.write_rows(
+                file, type, model.objects.order_by('id').values(
+                    *fields).iterator(self.chunk_size))
+        return counts
+
+    def iter_recipes(self):
+        """Рецепты с тегами и ингредиентами, по два запроса на пачку."""
+        recipes = Recipe.objects.order_by('id').values(
+            'id', 'author', 'name', 'text', 'image', 'cooking_time',
+            'pub_date').iterator(self.chunk_size)
+        for chunk in iter_chunks(recipes, self.chunk_size):
+            ids = [recipe['id'] for recipe in chunk]
+            tags = defaultdict(list)
+            for recipe_id, tag_id in Recipe.tags.through.objects.filter(
+                    recipe_id__in=ids).values_list('recipe_id', 'tag_id'):
+                tags[recipe_id].append(tag_id)
+            ingredients = defaultdict(list)
+            for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(reciepe_id__in=ids)
+                .order_by().values_list('reciepe_id', 'ingredient_id',
+                                        'amount')
+            ):
+                ingredients[recipe_id].append([ingredient_id, amount])
+            for recipe in chunk:
+                recipe['tags'] = tags[recipe['id']]
+                recipe['ingredients'] = ingredients[recipe['id']]
+                yield recipe
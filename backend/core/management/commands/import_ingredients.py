@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+import os
+import re
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from core.versions import bump_version
+from recipes.models import Ingredient
+
+JSON_CHUNK_SIZE = 64 * 1024
+# Разделители между объектами JSON-массива или строками NDJSON.
+SEPARATORS = re.compile(r'[\s,\[\]]*')
+
+
+def iter_csv_rows(file):
+    for row in csv.reader(file):
+        if len(row) < 2:
+            continue
+        if [cell.strip() for cell in row[:2]] == ['name', 'measurement_unit']:
+            continue
+        yield row[0], row[1]
+
+
+def iter_json_rows(file):
+    """
+    Читает JSON-массив объектов или NDJSON по частям,
+    не загружая весь файл в память.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    eof = False
+    while True:
+        position = SEPARATORS.match(buffer, position).end()
+        if position == len(buffer):
+            if eof:
+                return
+            buffer = file.read(JSON_CHUNK_SIZE)
+            position = 0
+            eof = not buffer
+            continue
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = file.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield item.get('name') or '', item.get('measurement_unit') or ''
+
+
+def clean_rows(rows, stats):
+    name_length = Ingredient._meta.get_field('name').max_length
+    unit_length = Ingredient._meta.get_field('measurement_unit').max_length
+    for name, measurement_unit in rows:
+        name, measurement_unit = name.strip(), measurement_unit.strip()
+        if (not name or not measurement_unit or len(name) > name_length
+                or len(measurement_unit) > unit_length):
+            stats['skipped'] += 1
+            continue
+        yield name, measurement_unit
+
+
+def iter_batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert_batch(batch):
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=name, name_lower=name.lower(),
+                    measurement_unit=measurement_unit)
+         for name, measurement_unit in batch),
+        ignore_conflicts=True,
+    )
+
+
+def copy_batch(cursor, batch):
+    """Загрузка пачки через COPY во временную таблицу (PostgreSQL)."""
+    data = io.StringIO()
+    writer = csv.writer(data)
+    for name, measurement_unit in batch:
+        writer.writerow((name, name.lower(), measurement_unit))
+    data.seek(0)
+    cursor.copy_expert(
+        'COPY ingredient_import (name, name_lower, measurement_unit) '
+        'FROM STDIN WITH CSV', data)
+    cursor.execute(
+        f'INSERT INTO {Ingredient._meta.db_table} '
+        '(pub_date, name, name_lower, measurement_unit) '
+        'SELECT now(), name, name_lower, measurement_unit '
+        'FROM ingredient_import ON CONFLICT DO NOTHING')
+    cursor.execute('TRUNCATE ingredient_import')
+
+
+class Command(BaseCommand):
+    help = ('Потоковый импорт ингредиентов из csv или json. '
+            'Повторный запуск не создает дублей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=settings.CSV_FILE_PATH)
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='По умолчанию определяется по расширению файла')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--no-copy', action='store_true',
+            help='Не использовать COPY даже на PostgreSQL')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        format = options['format'] or os.path.splitext(path)[1][1:].lower()
+        readers = {'csv': iter_csv_rows, 'json': iter_json_rows}
+        if format not in readers:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть больше 0')
+        use_copy = (connection.vendor == 'postgresql'
+                    and not options['no_copy'])
+
+        started = time.perf_counter()
+        before = Ingredient.objects.count()
+        read = 0
+        stats = {'skipped': 0}
+        with open(path, encoding='utf8', newline='') as file:
+            rows = clean_rows(readers[format](file), stats)
+            batches = iter_batches(rows, options['batch_size'])
+            if use_copy:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        'CREATE TEMP TABLE ingredient_import '
+                        '(name text, name_lower text, measurement_unit text)'
+                        ' ON COMMIT DROP')
+                    for batch in batches:
+                        copy_batch(cursor, batch)
+                        read += len(batch)
+            else:
+                for batch in batches:
+                    insert_batch(batch)
+                    read += len(batch)
+        created = Ingredient.objects.count() - before
+        elapsed = time.perf_counter() - started
+        if created:
+            bump_version(Ingredient)
+        self.stdout.write(
+            f'Обработано строк: {read}, добавлено: {created}, '
+            f'пропущено: {stats["skipped"]}. '
+            f'{read / elapsed if elapsed else read:.0f} строк/с '
+            f'({elapsed:.2f} с)'
+        )
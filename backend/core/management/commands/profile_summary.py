@@ -0,0 +1,90 @@
+import io
+import os
+import pstats
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.profiling import list_profiles
+
+
+def read_collapsed(paths):
+    stacks = Counter()
+    for path in paths:
+        with open(path, encoding='utf8') as file:
+            for line in file:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                stacks[stack] += int(count)
+    return stacks
+
+
+def summarize_collapsed(stacks):
+    """Собственные и общие выборки функций по сводке стеков."""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return own, total
+
+
+class Command(BaseCommand):
+    help = ('Список профилей из PROFILE_DIR или сводка самых тяжелых '
+            'функций по выбранным профилям (.prof и .collapsed).')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', help='Файлы профилей в PROFILE_DIR')
+        parser.add_argument(
+            '--latest', type=int, help='Свести N последних профилей')
+        parser.add_argument('--filter', default='',
+                            help='Подстрока имени, например RecipesViewSet')
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--sort', default='cumulative', choices=('cumulative', 'tottime'))
+
+    def handle(self, *args, **options):
+        profiles = [path for path in list_profiles()
+                    if options['filter'] in os.path.basename(path)]
+        if options['names']:
+            paths = [os.path.join(settings.PROFILE_DIR, name)
+                     for name in options['names']]
+            missing = [path for path in paths if not os.path.exists(path)]
+            if missing:
+                raise CommandError(f'Нет файлов: {", ".join(missing)}')
+        elif options['latest']:
+            paths = profiles[:options['latest']]
+        else:
+            for path in profiles:
+                self.stdout.write(
+                    f'{os.path.basename(path)}\t{os.path.getsize(path)}')
+            return
+        cprofile = [path for path in paths if path.endswith('.prof')]
+        collapsed = [path for path in paths if path.endswith('.collapsed')]
+        if cprofile:
+            self.summarize_cprofile(cprofile, options)
+        if collapsed:
+            self.summarize_sampling(collapsed, options['limit'])
+
+    def summarize_cprofile(self, paths, options):
+        stream = io.StringIO()
+        stats = pstats.Stats(*paths, stream=stream)
+        stats.strip_dirs().sort_stats(options['sort']).print_stats(
+            options['limit'])
+        self.stdout.write(f'cProfile, профилей: {len(paths)}')
+        self.stdout.write(stream.getvalue())
+
+    def summarize_sampling(self, paths, limit):
+        own, total = summarize_collapsed(read_collapsed(paths))
+        samples = sum(own.values())
+        self.stdout.write(
+            f'Выборки стеков, профилей: {len(paths)}, выборок: {samples}')
+        if not samples:
+            return
+        self.stdout.write('собственные  общие  функция')
+        for frame, count in own.most_common(limit):
+            self.stdout.write(
+                f'{count / samples:10.1%} {total[frame] / samples:6.1%}  '
+                f'{frame}')
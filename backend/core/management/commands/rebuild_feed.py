@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.feed import rebuild_feeds
+from users.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = ('Дополнение лент подписок после загрузки рецептов и подписок '
+            'в обход API и удаление записей без подписки')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            rebuild_feeds()
+        self.stdout.write(f'Записей в лентах: {FeedEntry.objects.count()}')
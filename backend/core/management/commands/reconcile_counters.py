@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Пересчет счетчиков favorites_count, in_carts_count '
+            'и recipes_count по фактическим данным')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать расхождения')
+
+    def handle(self, *args, **options):
+        result = reconcile_counters(dry_run=options['dry_run'])
+        action = 'Расхождений' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(f'{action}: ' + ', '.join(
+            f'{field}: {count}' for field, count in result.items()))
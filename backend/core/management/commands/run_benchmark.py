@@ -0,0 +1,222 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+from itertools import combinations
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+RECIPE_FILTERS = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+# Размер страницы, который запрашивает фронтенд.
+PAGE_SIZE = 6
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'run_benchmark',
+    },
+}
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def get_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = ('Прогон сценариев API через тестовый клиент на текущей базе '
+            '(см. seed_benchmark). Пишет p50/p95 и число запросов в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--output', default='-')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения')
+        parser.add_argument('--only', nargs='*', help='Имена сценариев')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.iterations = options['iterations']
+        users = list(User.objects.filter(
+            is_active=True).order_by('id').values_list('id', flat=True)[:100])
+        recipes = list(Recipe.objects.values_list('id', flat=True)[:1000])
+        if not users or not recipes:
+            raise CommandError('База пуста, запустите seed_benchmark')
+        self.user = User.objects.get(id=users[0])
+        self.authors = users
+        self.recipes = recipes
+        self.tags = list(Tag.objects.values_list('slug', flat=True)[:3])
+        self.tag_ids = list(Tag.objects.filter(
+            slug__in=self.tags[:1]).values_list('id', flat=True))
+        self.own_recipe = Recipe.objects.filter(
+            author=self.user).values_list('id', flat=True).first()
+        self.ingredients = list(
+            Ingredient.objects.values_list('id', flat=True)[:10])
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        results = {}
+        # Отдельный кэш в памяти: measure() очищает его перед каждым
+        # прогоном, и общий кэш (Redis, memcached) трогать нельзя.
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            for name, scenario in self.get_scenarios():
+                if options['only'] and not any(
+                        name.startswith(prefix)
+                        for prefix in options['only']):
+                    continue
+                results[name] = self.measure(scenario)
+                self.stderr.write(
+                    f'{name}: p50 {results[name]["p50_ms"]} мс, '
+                    f'p95 {results[name]["p95_ms"]} мс, '
+                    f'запросов {results[name]["queries"]}')
+            cache.clear()
+        report = {
+            'revision': get_revision(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'iterations': self.iterations,
+            'data': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'results': results,
+        }
+        content = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output'] == '-':
+            self.stdout.write(content)
+        else:
+            with open(options['output'], 'w', encoding='utf8') as file:
+                file.write(content)
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def measure(self, scenario):
+        timings, queries, statuses = [], [], set()
+        for _ in range(self.iterations):
+            # Кэш ответов мешает сравнивать одни и те же запросы.
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = scenario()
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(context))
+            statuses.add(response.status_code)
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'queries': max(queries),
+            'statuses': sorted(statuses),
+        }
+
+    def get_scenarios(self):
+        list_url = reverse('api:recipes-list')
+        for size in range(len(RECIPE_FILTERS) + 1):
+            for filters in combinations(RECIPE_FILTERS, size):
+                name = 'recipes_list' + ''.join(f'.{key}' for key in filters)
+                yield name, self.recipe_list(list_url, filters)
+        for ordering in ('popular', 'trending'):
+            yield f'recipes_ordering.{ordering}', (
+                lambda ordering=ordering: self.client.get(
+                    list_url, {'limit': PAGE_SIZE, 'ordering': ordering}))
+        yield 'recipes_feed', lambda: self.client.get(
+            reverse('api:recipes-feed'), {'limit': PAGE_SIZE})
+        yield 'recipes_retrieve', lambda: self.client.get(reverse(
+            'api:recipes-detail',
+            kwargs={'id': self.rng.choice(self.recipes)}))
+        yield 'subscriptions', lambda: self.client.get(
+            reverse('api:users-subscriptions'),
+            {'limit': PAGE_SIZE, 'recipes_limit': 3})
+        for term in ('а', 'ingredient', 'ингредиент 1'):
+            yield f'ingredients_search.{term}', (
+                lambda term=term: self.client.get(
+                    reverse('api:ingredients-list'), {'name': term}))
+        for format in ('txt', 'csv', 'json'):
+            yield f'download_shopping_cart.{format}', (
+                lambda format=format: self.client.get(
+                    reverse('api:recipes-download-shopping-cart'),
+                    {'format': format}))
+        yield 'recipes_create', self.recipe_create
+        yield 'recipes_update', self.recipe_update
+
+    def recipe_list(self, url, filters):
+        def scenario():
+            params = {'limit': PAGE_SIZE}
+            if 'tags' in filters:
+                params['tags'] = self.tags[:2]
+            if 'author' in filters:
+                params['author'] = self.rng.choice(self.authors[:10])
+            if 'is_favorited' in filters:
+                params['is_favorited'] = 1
+            if 'is_in_shopping_cart' in filters:
+                params['is_in_shopping_cart'] = 1
+            return self.client.get(url, params)
+        return scenario
+
+    def get_recipe_data(self):
+        return {
+            'ingredients': [
+                {'id': pk, 'amount': self.rng.randint(1, 100)}
+                for pk in self.rng.sample(
+                    self.ingredients, min(5, len(self.ingredients)))
+            ],
+            'tags': self.tag_ids,
+            'image': None,
+            'name': 'Рецепт для замера',
+            'text': 'Текст',
+            'cooking_time': 10,
+        }
+
+    def recipe_create(self):
+        with transaction.atomic():
+            response = self.client.post(
+                reverse('api:recipes-list'), self.get_recipe_data(),
+                format='json')
+            transaction.set_rollback(True)
+        return response
+
+    def recipe_update(self):
+        if self.own_recipe is None:
+            raise CommandError('У пользователя нет рецептов для update')
+        with transaction.atomic():
+            response = self.client.patch(
+                reverse('api:recipes-detail', kwargs={'id': self.own_recipe}),
+                self.get_recipe_data(), format='json')
+            transaction.set_rollback(True)
+        return response
+
+    def compare(self, path, results):
+        with open(path, encoding='utf8') as file:
+            previous = json.load(file)['results']
+        for name, result in results.items():
+            if name not in previous:
+                continue
+            before = previous[name]
+            change = (result['p50_ms'] / before['p50_ms'] - 1) * 100 \
+                if before['p50_ms'] else 0
+            self.stderr.write(
+                f'{name}: p50 {before["p50_ms"]} -> {result["p50_ms"]} мс '
+                f'({change:+.0f}%), запросов {before["queries"]} -> '
+                f'{result["queries"]}')
@@ -0,0 +1,167 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.feed import rebuild_feeds
+from core.bulk import insert_rows, insert_rows_returning_ids
+from core.counters import reconcile_counters
+from core.trending import update_trending_scores
+from core.versions import bump_version
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from users.models import Favorite, Follow, ShoppingCart, User
+
+PREFIX = 'bench'
+
+
+class Zipf:
+    """Выбор элементов с вероятностью, обратной степени ранга."""
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        self.cum_weights = list(accumulate(
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)))
+
+    def choice(self):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights)[0]
+
+    def sample(self, count):
+        """До count различных элементов."""
+        result = set()
+        for _ in range(count * 3):
+            result.add(self.choice())
+            if len(result) >= count:
+                break
+        return result
+
+
+class Command(BaseCommand):
+    help = ('Генерация синтетических данных для run_benchmark: '
+            'популярность авторов, рецептов и ингредиентов '
+            'распределена по закону Ципфа.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--follows', type=int, default=10,
+                            help='Подписок на пользователя')
+        parser.add_argument('--favorites', type=int, default=20,
+                            help='Избранных рецептов на пользователя')
+        parser.add_argument('--carts', type=int, default=5,
+                            help='Рецептов в списке покупок пользователя')
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--zipf', type=float, default=1.1)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f'{PREFIX}_').exists():
+            raise CommandError(
+                'Синтетические данные уже созданы, используйте чистую базу')
+        self.rng = random.Random(options['seed'])
+        self.exponent = options['zipf']
+        started = time.perf_counter()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            tags = self.create_tags(options['tags'])
+            ingredients = self.create_ingredients(options['ingredients'])
+            recipes = self.create_recipes(
+                options['recipes'], users, tags, ingredients,
+                options['ingredients_per_recipe'])
+            self.create_edges(Follow, ('user', 'author'), users,
+                              Zipf(self.rng, users, self.exponent),
+                              options['follows'])
+            recipe_zipf = Zipf(self.rng, recipes, self.exponent)
+            self.create_edges(Favorite, ('user', 'recipe'), users,
+                              recipe_zipf, options['favorites'])
+            self.create_edges(ShoppingCart, ('user', 'recipe'), users,
+                              recipe_zipf, options['carts'])
+            # Строки вставлены в обход сигналов.
+            reconcile_counters()
+            update_trending_scores()
+            rebuild_feeds()
+        bump_version(Tag)
+        bump_version(Ingredient)
+        self.stdout.write(
+            f'Созданы пользователи: {len(users)}, рецепты: {len(recipes)}, '
+            f'ингредиенты: {len(ingredients)}, теги: {len(tags)} '
+            f'за {time.perf_counter() - started:.1f} с'
+        )
+
+    def create_users(self, count):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'{PREFIX}_{number}',
+                  email=f'{PREFIX}_{number}@example.com',
+                  first_name='Bench', last_name=str(number),
+                  password=password)
+             for number in range(count)),
+            batch_size=500,
+        )
+        # Первые пользователи - самые популярные авторы.
+        return list(User.objects.filter(
+            username__startswith=f'{PREFIX}_').order_by('id').values_list(
+            'id', flat=True))
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            Tag(name=f'{PREFIX} {number}', slug=f'{PREFIX}_{number}',
+                color=f'#{number:06x}')
+            for number in range(count)
+        )
+        return list(Tag.objects.filter(
+            slug__startswith=f'{PREFIX}_').values_list('id', flat=True))
+
+    def create_ingredients(self, count):
+        Ingredient.objects.bulk_create(
+            (Ingredient(name=f'{PREFIX} ингредиент {number}',
+                        name_lower=f'{PREFIX} ингредиент {number}',
+                        measurement_unit='г')
+             for number in range(count)),
+            batch_size=500,
+        )
+        return list(Ingredient.objects.filter(
+            name__startswith=f'{PREFIX} ').order_by('id').values_list(
+            'id', flat=True))
+
+    def create_recipes(self, count, users, tags, ingredients, per_recipe):
+        authors = Zipf(self.rng, users, self.exponent)
+        ingredient_zipf = Zipf(self.rng, ingredients, self.exponent)
+        now = timezone.now()
+        adapt_datetime = connection.ops.adapt_datetimefield_value
+        ids = insert_rows_returning_ids(Recipe, [
+            'author', 'name', 'text', 'cooking_time', 'pub_date'
+        ], [
+            [authors.choice(), f'{PREFIX} рецепт {number}', 'Описание',
+             self.rng.randint(1, 120),
+             adapt_datetime(now - timedelta(minutes=number))]
+            for number in range(count)
+        ])
+        insert_rows(RecipeIngredient, ['reciepe', 'ingredient', 'amount'], [
+            (pk, ingredient_id, self.rng.randint(1, 500))
+            for pk in ids
+            for ingredient_id in ingredient_zipf.sample(per_recipe)
+        ])
+        insert_rows(Recipe.tags.through, ['recipe', 'tag'], [
+            (pk, tag_id)
+            for pk in ids
+            for tag_id in self.rng.sample(tags, min(len(tags),
+                                                    self.rng.randint(1, 3)))
+        ])
+        return ids
+
+    def create_edges(self, model, fields, users, targets, per_user):
+        rows = [
+            (user_id, target)
+            for user_id in users
+            for target in targets.sample(per_user)
+            if target != user_id or model is not Follow
+        ]
+        insert_rows(model, fields, rows, ignore_conflicts=True)
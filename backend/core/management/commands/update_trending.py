@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cache import invalidate_response_cache
+from core.trending import update_trending_scores
+
+
+class Command(BaseCommand):
+    help = ('Пересчет Recipe.trending_score для ?ordering=trending. '
+            'Запускается периодически, например cron раз в 10 минут.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=float, default=settings.TRENDING_WINDOW_HOURS,
+            help='Окно в часах')
+        parser.add_argument(
+            '--half-life', type=float,
+            default=settings.TRENDING_HALF_LIFE_HOURS,
+            help='Период полураспада веса добавления в часах')
+
+    def handle(self, *args, **options):
+        updated = update_trending_scores(
+            window=timedelta(hours=options['window']),
+            half_life=timedelta(hours=options['half_life']))
+        if updated:
+            invalidate_response_cache('recipes')
+        self.stdout.write(f'Обновлено рецептов: {updated}')
@@ -0,0 +1,61 @@
+import json
+import logging
+
+from django.conf import settings
+from django.db import connection
+
+from .stats import request_stats
+from .timing import RequestTimings, set_current_timings
+
+logger = logging.getLogger('core.timing')
+
+
+def get_view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class ServerTimingMiddleware:
+    """
+    Замеряет время запросов к базе, сериализации и рендеринга,
+    отдает его в заголовке Server-Timing, пишет в лог core.timing
+    и копит гистограммы для core.views.stats и metrics.
+    Время отдачи потоковых ответов не учитывается.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        set_current_timings(timings)
+        try:
+            with connection.execute_wrapper(timings):
+                response = self.get_response(request)
+        finally:
+            set_current_timings(None)
+            timings.finish()
+        view = get_view_name(request)
+        request_stats.observe(view, request.method, timings)
+        phases = {'db': timings.db_time, **timings.phases,
+                  'total': timings.total}
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.1f}'
+                + (f';desc="{timings.db_count} queries"'
+                   if name == 'db' else '')
+                for name, seconds in phases.items()
+            )
+        data = {
+            'view': view,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': timings.db_count,
+            **{f'{name}_ms': round(seconds * 1000, 2)
+               for name, seconds in phases.items()},
+        }
+        logger.info(json.dumps(data, ensure_ascii=False), extra=data)
+        return response
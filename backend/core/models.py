@@ -2,6 +2,25 @@ from django.core.validators import MinLengthValidator
 from django.db import models
 
 
+class CounterFieldsMixin:
+    """
+    Не записывает счетчики counter_fields при обычном save()
+    существующей строки: они меняются только атомарными UPDATE
+    с F(), и значения, прочитанные до сохранения, их бы затерли.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (not self._state.adding and kwargs.get('update_fields') is None
+                and not kwargs.get('force_insert')):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
 class CreatedModel(models.Model):
     """Абстрактная модель. Добавляет дату создания."""
 
@@ -28,3 +47,28 @@ class CreatedNameModel(CreatedModel):
 
     def __str__(self):
         return self.name
+
+
+class ModelVersion(models.Model):
+    """Счетчик изменений модели. Используется для версионирования кэша."""
+
+    label = models.CharField(
+        max_length=100,
+        unique=True,
+        verbose_name='Модель'
+    )
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+    updated = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия модели'
+        verbose_name_plural = 'Версии моделей'
+
+    def __str__(self):
+        return f'{self.label}: {self.version}'
@@ -0,0 +1,103 @@
+import threading
+from bisect import bisect_left
+
+# Границы корзин: секунды для этапов, штуки для числа запросов.
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_cumulative(self):
+        """Пары (граница, число значений не больше нее), как в Prometheus."""
+        total, result = 0, []
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+class RequestStats:
+    """Гистограммы времени этапов и числа запросов по представлениям."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations = {}
+        self.queries = {}
+
+    def observe(self, view, method, timings):
+        phases = {'total': timings.total, 'db': timings.db_time,
+                  **timings.phases}
+        with self.lock:
+            for phase, seconds in phases.items():
+                self.durations.setdefault(
+                    (view, method, phase), Histogram(DURATION_BUCKETS)
+                ).observe(seconds)
+            self.queries.setdefault(
+                (view, method), Histogram(QUERY_BUCKETS)
+            ).observe(timings.db_count)
+
+    def reset(self):
+        with self.lock:
+            self.durations.clear()
+            self.queries.clear()
+
+    def as_dict(self):
+        with self.lock:
+            result = {}
+            for (view, method, phase), histogram in self.durations.items():
+                item = result.setdefault(f'{method} {view}', {})
+                item[phase] = {
+                    'count': histogram.count,
+                    'avg_ms': round(histogram.sum / histogram.count * 1000, 2),
+                    'buckets': {str(bound): count for bound, count
+                                in histogram.get_cumulative()},
+                }
+            for (view, method), histogram in self.queries.items():
+                result[f'{method} {view}']['queries'] = {
+                    'count': histogram.count,
+                    'avg': round(histogram.sum / histogram.count, 2),
+                    'buckets': {str(bound): count for bound, count
+                                in histogram.get_cumulative()},
+                }
+            return result
+
+    def as_prometheus(self):
+        lines = []
+        with self.lock:
+            for name, help, data in (
+                ('foodgram_request_phase_seconds',
+                 'Время этапа обработки запроса', self.durations),
+                ('foodgram_request_queries',
+                 'Число SQL-запросов на запрос', self.queries),
+            ):
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} histogram')
+                for key, histogram in sorted(data.items()):
+                    labels = format_labels(key)
+                    for bound, count in histogram.get_cumulative():
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(
+                        f'{name}_count{{{labels}}} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(key):
+    names = ('view', 'method', 'phase')
+    return ','.join(
+        f'{name}="{value}"' for name, value in zip(names, key))
+
+
+request_stats = RequestStats()
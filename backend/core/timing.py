@@ -0,0 +1,57 @@
+import threading
+import time
+from contextlib import contextmanager
+
+_local = threading.local()
+
+
+class RequestTimings:
+    """
+    Время запроса по этапам: db считается через execute_wrapper,
+    остальные этапы - через measure(), без времени запросов к базе.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total = None
+        self.db_time = 0
+        self.db_count = 0
+        self.phases = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.db_count += 1
+
+    def add(self, name, seconds):
+        self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+
+
+def get_current_timings():
+    return getattr(_local, 'timings', None)
+
+
+def set_current_timings(timings):
+    _local.timings = timings
+
+
+@contextmanager
+def measure(name):
+    """Добавляет время блока к этапу name текущего запроса."""
+    timings = get_current_timings()
+    if timings is None:
+        yield
+        return
+    db_time = timings.db_time
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started
+                    - (timings.db_time - db_time))
@@ -0,0 +1,45 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from recipes.models import Recipe
+from users.models import Favorite
+
+UPDATE_BATCH_SIZE = 500
+
+
+def get_trending_scores(now, window, half_life):
+    """
+    Сумма добавлений в избранное за окно window, каждое с весом
+    0.5 ** (возраст / half_life). Читает только избранное из окна.
+    """
+    scores = {}
+    favorites = Favorite.objects.filter(
+        pub_date__gte=now - window).values_list('recipe_id', 'pub_date')
+    for recipe_id, pub_date in favorites.iterator():
+        weight = 0.5 ** ((now - pub_date) / half_life)
+        scores[recipe_id] = scores.get(recipe_id, 0) + weight
+    return scores
+
+
+def update_trending_scores(now=None, window=None, half_life=None):
+    """
+    Пересчитывает Recipe.trending_score рецептов с избранным в окне
+    и обнуляет рецепты, выпавшие из окна. Возвращает число
+    обновленных рецептов.
+    """
+    now = now or timezone.now()
+    window = window or timedelta(hours=settings.TRENDING_WINDOW_HOURS)
+    half_life = half_life or timedelta(
+        hours=settings.TRENDING_HALF_LIFE_HOURS)
+    scores = get_trending_scores(now, window, half_life)
+    updated = Recipe.objects.filter(trending_score__gt=0).exclude(
+        id__in=Favorite.objects.filter(
+            pub_date__gte=now - window).values('recipe_id')
+    ).update(trending_score=0)
+    recipes = [Recipe(id=pk, trending_score=round(score, 6))
+               for pk, score in scores.items()]
+    Recipe.objects.bulk_update(
+        recipes, ['trending_score'], batch_size=UPDATE_BATCH_SIZE)
+    return updated + len(recipes)
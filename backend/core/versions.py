@@ -0,0 +1,29 @@
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ModelVersion
+
+
+def bump_version(model):
+    """Увеличивает версию модели после изменения ее данных."""
+    label = model._meta.label_lower
+    updated = ModelVersion.objects.filter(label=label).update(
+        version=F('version') + 1, updated=timezone.now())
+    if not updated:
+        _, created = ModelVersion.objects.get_or_create(
+            label=label, defaults={'version': 1})
+        if not created:
+            bump_version(model)
+
+
+def get_versions(models):
+    """
+    Возвращает версии и даты изменения моделей одним запросом.
+    Для еще не менявшихся моделей версия 0, дата None.
+    """
+    labels = [model._meta.label_lower for model in models]
+    found = {
+        version.label: (version.version, version.updated)
+        for version in ModelVersion.objects.filter(label__in=labels)
+    }
+    return [found.get(label, (0, None)) for label in labels]
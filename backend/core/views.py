@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from .stats import request_stats
+
+
+def check_stats_access(request):
+    """Статистика доступна с адресов STATS_ALLOWED_IPS и персоналу."""
+    if request.META.get('REMOTE_ADDR') in settings.STATS_ALLOWED_IPS:
+        return
+    if request.user.is_authenticated and request.user.is_staff:
+        return
+    raise PermissionDenied
+
+
+# Доступ ограничен адресом или персоналом, DELETE шлют curl и скрипты.
+@csrf_exempt
+def stats(request):
+    check_stats_access(request)
+    if request.method == 'DELETE':
+        request_stats.reset()
+        return HttpResponse(status=204)
+    return JsonResponse(request_stats.as_dict(),
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def metrics(request):
+    check_stats_access(request)
+    return HttpResponse(request_stats.as_prometheus(),
+                        content_type='text/plain; version=0.0.4')
@@ -11,7 +11,7 @@ class RecipeIngredientInline(admin.TabularInline):
 class RecipeAdmin(admin.ModelAdmin):
 
     def favorite_count_field(self, obj):
-        return obj.favorited.count()
+        return obj.favorites_count
     favorite_count_field.short_description = ('Количество добавлений '
                                               'рецепта в избранное')
 
@@ -19,6 +19,8 @@ class RecipeAdmin(admin.ModelAdmin):
         'pk',
         'name',
         'author',
+        'favorites_count',
+        'in_carts_count',
     )
 
     search_fields = (
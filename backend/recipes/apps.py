@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class RecipesConfig(AppConfig):
     name = 'recipes'
     verbose_name = 'Рецепты'
+
+    def ready(self):
+        from .signals import (create_ingredient_trigram_index,
+                              fill_ingredients_name_lower)
+        post_migrate.connect(fill_ingredients_name_lower, sender=self)
+        post_migrate.connect(create_ingredient_trigram_index, sender=self)
@@ -1,10 +1,11 @@
 from django.core.validators import MinLengthValidator, MinValueValidator
 from django.db import models
 
-from core.models import CreatedModel, CreatedNameModel
+from core.models import CounterFieldsMixin, CreatedModel, CreatedNameModel
 
 
-class Recipe(CreatedNameModel):
+class Recipe(CounterFieldsMixin, CreatedNameModel):
+    counter_fields = ('favorites_count', 'in_carts_count', 'trending_score')
 
     author = models.ForeignKey(
         'users.User',
@@ -17,6 +18,18 @@ class Recipe(CreatedNameModel):
         verbose_name='Изображение',
         blank=True,
     )
+    image_small = models.ImageField(
+        upload_to='recipes/images/',
+        verbose_name='Миниатюра',
+        blank=True,
+        editable=False,
+    )
+    image_medium = models.ImageField(
+        upload_to='recipes/images/',
+        verbose_name='Изображение для карточки',
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name='Описание рецепта',
         validators=[MinLengthValidator(1, 'Пустое поле')]
@@ -36,11 +49,36 @@ class Recipe(CreatedNameModel):
         verbose_name='Время приготовления',
         validators=[MinValueValidator(1, 'Минимальное время 1 м.')],
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в избранное',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        verbose_name='Добавлений в список покупок',
+        default=0,
+        editable=False,
+    )
+    trending_score = models.FloatField(
+        verbose_name='Популярность за последнее время',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'Рецепты'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+            models.Index(fields=['-favorites_count', '-id'],
+                         name='recipe_favorites_count_idx'),
+            models.Index(fields=['-trending_score', '-id'],
+                         name='recipe_trending_score_idx'),
+        ]
 
 
 class Tag(CreatedNameModel):
@@ -50,7 +88,8 @@ class Tag(CreatedNameModel):
         verbose_name='Цвет',
     )
     slug = models.SlugField(
-        verbose_name='slug'
+        verbose_name='slug',
+        unique=True,
     )
 
     class Meta:
@@ -65,11 +104,30 @@ class Ingredient(CreatedNameModel):
         max_length=10,
         verbose_name='Единица измерения'
     )
+    name_lower = models.CharField(
+        max_length=256,
+        verbose_name='Название для поиска',
+        editable=False,
+        default='',
+    )
 
     class Meta:
         verbose_name = 'Ингредиенты'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['name_lower'],
+                         name='ingredient_name_lower_idx',
+                         opclasses=['varchar_pattern_ops']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'measurement_unit'],
+                                    name='unique_ingredient_name_unit')
+        ]
+
+    def save(self, *args, **kwargs):
+        self.name_lower = self.name.lower()
+        super().save(*args, **kwargs)
 
 
 class RecipeIngredient(CreatedModel):
@@ -0,0 +1,36 @@
+import logging
+
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+TRIGRAM_INDEX_SQL = (
+    'CREATE INDEX IF NOT EXISTS ingredient_name_lower_trgm_idx '
+    'ON recipes_ingredient USING gin (name_lower gin_trgm_ops)'
+)
+
+
+def fill_ingredients_name_lower(sender, **kwargs):
+    """Заполняет поисковое поле у ингредиентов, созданных до его появления."""
+    from .models import Ingredient
+
+    ingredients = list(Ingredient.objects.filter(name_lower=''))
+    for ingredient in ingredients:
+        ingredient.name_lower = ingredient.name.lower()
+    Ingredient.objects.bulk_update(
+        ingredients, ['name_lower'], batch_size=1000)
+
+
+def create_ingredient_trigram_index(sender, **kwargs):
+    """
+    Создает триграммный индекс для поиска ингредиентов по вхождению.
+    Требует расширения pg_trgm, поэтому только для PostgreSQL.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cursor.execute(TRIGRAM_INDEX_SQL)
+    except DatabaseError as error:
+        logger.warning('Триграммный индекс не создан: %s', error)
@@ -1,15 +1,42 @@
+import base64
+import itertools
+import json
+import os
+import tempfile
 from collections import OrderedDict
-from unittest import TestCase
+from concurrent.futures import Future
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import TestCase, mock
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
 from django.db import connection
+from django.http import QueryDict
 from django.urls import reverse
+from django.test import Client, override_settings
 from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
 from rest_framework import status
-from rest_framework.test import APIClient, APITestCase
+from rest_framework.test import APIClient, APIRequestFactory, APITestCase
 
+from api.filters import RecipeFilter
+from api.images import get_variant_name, log_variant_errors, submit_variants
+from api.pdf import get_pdf_path
+from api.queries import QueryBudgetExceeded, get_fingerprint
 from api.serializers import RecipesSerializer, IngredientSerializer, TagSerializer
-from recipes.models import Ingredient, Tag, Recipe
-from users.models import User
+from api.cache import get_generation, get_generation_key, invalidate_response_cache
+from api.testing import (assert_queries_independent_of_page_size,
+                         capture_on_commit_callbacks)
+from api.views import RecipesViewSet
+from core.counters import reconcile_counters
+from core.trending import update_trending_scores
+from recipes.models import Ingredient, Tag, Recipe, RecipeIngredient
+from users.models import Favorite, Follow, ShoppingCart, User
 
 
 class RecipesApiTestCase(APITestCase):
@@ -88,6 +115,9 @@ class RecipesApiTestCase(APITestCase):
         cls.auth_client = APIClient()
         cls.auth_client.force_authenticate(user=cls.user_1)
 
+    def setUp(self):
+        cache.clear()
+
     def test_recipe_get_list(self):
         url = reverse('api:recipes-list')
         with CaptureQueriesContext(connection) as queries:
@@ -97,6 +127,195 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer_data, response.data)
 
+    def test_recipe_get_list_user_flags_queries(self):
+        url = reverse('api:recipes-list')
+        for number in range(10):
+            Recipe.objects.create(
+                name=f'recipe_page_{number}',
+                text='text',
+                cooking_time=1,
+                author=self.user_3
+            )
+        self.user_1.is_favorited.add(self.recipe_1)
+        self.user_1.is_in_shopping_cart.add(self.recipe_2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.auth_client.get(url, data={'limit': 13})
+        flags_queries = [
+            query for query in queries.captured_queries
+            if 'users_user_is_favorited' in query['sql']
+            or 'users_user_is_in_shopping_cart' in query['sql']
+        ]
+        results = {item['id']: item for item in response.data['results']}
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(13, len(results))
+        self.assertEqual(2, len(flags_queries))
+        self.assertTrue(results[self.recipe_1.id]['is_favorited'])
+        self.assertFalse(results[self.recipe_1.id]['is_in_shopping_cart'])
+        self.assertTrue(results[self.recipe_2.id]['is_in_shopping_cart'])
+        self.assertFalse(results[self.recipe_3.id]['is_favorited'])
+
+    def test_recipe_get_list_queries_count(self):
+        url = reverse('api:recipes-list')
+        ingredients = [self.ingredient_1, self.ingredient_2]
+        for number in range(10):
+            recipe = Recipe.objects.create(
+                name=f'recipe_page_{number}',
+                text='text',
+                cooking_time=1,
+                author=self.user_1 if number % 2 else self.user_3
+            )
+            recipe.ingredients.add(*ingredients, through_defaults={'amount': 1})
+            recipe.tags.add(self.tag_1, self.tag_2)
+        Follow.objects.create(user=self.user_1, author=self.user_3)
+        with CaptureQueriesContext(connection) as small_page:
+            self.auth_client.get(url, data={'limit': 3})
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.auth_client.get(url, data={'limit': 13})
+        authors = {
+            item['author']['id']: item['author']['is_subscribed']
+            for item in response.data['results']
+        }
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(5, len(full_page))
+        self.assertEqual(len(small_page), len(full_page))
+        self.assertTrue(authors[self.user_3.id])
+        self.assertFalse(authors[self.user_2.id])
+
+    def test_recipe_get_list_page_size_independent(self):
+        Recipe.objects.bulk_create(
+            Recipe(name=f'recipe_page_{number}', text='text',
+                   cooking_time=1, author=self.user_3)
+            for number in range(100)
+        )
+        ids = Recipe.objects.filter(
+            name__startswith='recipe_page_').values_list('id', flat=True)
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                reciepe_id=pk, ingredient=self.ingredient_1, amount=1)
+            for pk in ids)
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=pk, tag=self.tag_1) for pk in ids)
+        url = reverse('api:recipes-list')
+        assert_queries_independent_of_page_size(self, self.auth_client, url)
+        assert_queries_independent_of_page_size(
+            self, self.auth_client, url, {'tags': 'tag1'})
+
+    def test_recipe_query_budget(self):
+        url = reverse('api:recipes-list')
+        with mock.patch.object(RecipesViewSet, 'query_budgets', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.auth_client.get(url, data={'limit': 2})
+            with override_settings(QUERY_BUDGET_STRICT=False):
+                with self.assertLogs('api.queries', 'WARNING') as logs:
+                    response = self.auth_client.get(url, data={'limit': 2})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertIn('RecipesViewSet.list', logs.output[0])
+        self.assertEqual(
+            get_fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s) AND a = 'x'"),
+            'SELECT ? FROM t WHERE id IN (...) AND a = ?')
+
+    def test_recipe_server_timing(self):
+        response_reset = Client(enforce_csrf_checks=True).delete(
+            reverse('stats'))
+        self.assertEqual(status.HTTP_204_NO_CONTENT, response_reset.status_code)
+        response = self.auth_client.get(
+            reverse('api:recipes-list'), data={'limit': 2})
+        phases = {
+            item.split(';')[0]: item
+            for item in response['Server-Timing'].split(', ')
+        }
+        self.assertEqual({'db', 'serialize', 'render', 'total'}, set(phases))
+        self.assertIn('queries"', phases['db'])
+        stats = self.client.get(reverse('stats')).json()
+        self.assertEqual(
+            1, stats['GET api:recipes-list']['total']['count'])
+        self.assertEqual(
+            1, stats['GET api:recipes-list']['queries']['count'])
+        metrics = self.client.get(reverse('metrics'))
+        self.assertEqual(status.HTTP_200_OK, metrics.status_code)
+        self.assertIn(
+            'foodgram_request_phase_seconds_count{view="api:recipes-list",'
+            'method="GET",phase="serialize"} 1',
+            metrics.content.decode())
+        self.assertEqual(
+            status.HTTP_403_FORBIDDEN,
+            self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.1')
+            .status_code)
+
+    def test_recipe_anonymous_cache(self):
+        url = reverse('api:recipes-list')
+        url_detail = reverse('api:recipes-detail', kwargs={'id': self.recipe_1.id})
+        self.client.get(url, data={'tags': ['tag2', 'tag1']})
+        self.client.get(url_detail)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, data={'tags': ['tag1', 'tag2']})
+            self.client.get(url_detail)
+        self.assertEqual(2, len(response.data))
+        with capture_on_commit_callbacks():
+            self.recipe_3.tags.remove(self.tag_2)
+        response = self.client.get(url, data={'tags': ['tag1', 'tag2']})
+        with self.assertNumQueries(0):
+            self.client.get(url_detail)
+        self.assertEqual(1, len(response.data))
+        self.ingredient_1.name = 'ingredient_1_new'
+        with capture_on_commit_callbacks():
+            self.ingredient_1.save()
+        response = self.client.get(url_detail)
+        names = [item['name'] for item in response.data['ingredients']]
+        self.assertIn('ingredient_1_new', names)
+        response_auth = self.auth_client.get(url_detail)
+        self.assertFalse(response_auth.data['is_favorited'])
+
+    def test_recipe_anonymous_cache_counters(self):
+        url_detail = reverse('api:recipes-detail', kwargs={'id': self.recipe_1.id})
+        self.client.get(url_detail)
+        with capture_on_commit_callbacks():
+            favorite = Favorite.objects.create(
+                user=self.user_3, recipe=self.recipe_1)
+        self.assertEqual(
+            1, self.client.get(url_detail).data['favorites_count'])
+        with capture_on_commit_callbacks():
+            favorite.delete()
+        self.assertEqual(
+            0, self.client.get(url_detail).data['favorites_count'])
+
+    def test_recipe_cache_invalidated_on_commit(self):
+        key = get_generation_key('recipes', 'list')
+        generation = get_generation(key)
+        with capture_on_commit_callbacks(execute=False) as callbacks:
+            invalidate_response_cache('recipes', [self.recipe_1.id])
+        self.assertEqual(generation, get_generation(key))
+        self.assertEqual(1, len(callbacks))
+        callbacks[0]()
+        self.assertEqual(generation + 1, get_generation(key))
+
+    def test_recipe_get_list_cursor_pagination(self):
+        url = reverse('api:recipes-list')
+        for number in range(4):
+            Recipe.objects.create(
+                name=f'recipe_page_{number}',
+                text='text',
+                cooking_time=1,
+                author=self.user_3
+            )
+        ids = []
+        next_url = f'{url}?pagination=cursor&limit=2'
+        while next_url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.auth_client.get(next_url)
+            self.assertEqual(status.HTTP_200_OK, response.status_code)
+            self.assertNotIn('count', response.data)
+            self.assertFalse(any(
+                'COUNT(' in query['sql'] for query in queries.captured_queries))
+            ids += [recipe['id'] for recipe in response.data['results']]
+            next_url = response.data['next']
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True))
+        response_count = self.client.get(
+            url, data={'pagination': 'cursor', 'count': 'true'})
+        self.assertEqual(expected, ids)
+        self.assertEqual(7, response_count.data['count'])
+
     def test_recipe_get_detail(self):
         pk = self.recipe_2.id
         url = reverse('api:recipes-detail', kwargs={'id': pk})
@@ -133,6 +352,141 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(Recipe.objects.count(), 4)
         self.assertEqual(Recipe.objects.get(id=4).name, "Recipe_4")
 
+    def test_recipe_create_recipe_bulk_ingredients(self):
+        url = reverse('api:recipes-list')
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'bulk_{number}', measurement_unit='g')
+            for number in range(30)
+        )
+        ingredients = Ingredient.objects.filter(name__startswith='bulk_')
+        data = {
+            "ingredients": [
+                {"id": ingredient.id, "amount": 1}
+                for ingredient in ingredients
+            ],
+            "tags": [1, 2],
+            "image": None,
+            "name": "Recipe_bulk",
+            "text": "string",
+            "cooking_time": 1
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = self.auth_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertLess(len(context), 15)
+        recipe = Recipe.objects.get(name='Recipe_bulk')
+        self.assertEqual(30, recipe.ingredients.count())
+        self.assertEqual(2, recipe.tags.count())
+
+    def test_recipe_create_recipe_missing_ingredient(self):
+        url = reverse('api:recipes-list')
+        data = {
+            "ingredients": [
+                {"id": self.ingredient_1.id, "amount": 1},
+                {"id": 999, "amount": 1}
+            ],
+            "tags": [1],
+            "image": None,
+            "name": "Recipe_missing",
+            "text": "string",
+            "cooking_time": 1
+        }
+        response = self.auth_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.filter(name='Recipe_missing').exists())
+
+    def test_recipe_create_recipe_image_limits(self):
+        url = reverse('api:recipes-list')
+        image = BytesIO()
+        Image.new('RGB', (50, 40)).save(image, 'PNG')
+        data = {
+            "ingredients": [{"id": self.ingredient_1.id, "amount": 1}],
+            "tags": [1],
+            "image": ('data:image/png;base64,'
+                      + base64.b64encode(image.getvalue()).decode()),
+            "name": "Recipe_image",
+            "text": "string",
+            "cooking_time": 1
+        }
+        with override_settings(IMAGE_UPLOAD_MAX_SIZE=10):
+            response = self.auth_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', response.data)
+        with override_settings(IMAGE_MAX_PIXELS=1000):
+            response = self.auth_client.post(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, FILE_UPLOAD_MAX_MEMORY_SIZE=10):
+            response = self.auth_client.post(url, data, format='json')
+            self.assertEqual(
+                response.status_code, status.HTTP_201_CREATED)
+
+    def test_recipe_image_variants(self):
+        image = BytesIO()
+        Image.new('RGBA', (3000, 1500)).save(image, 'PNG')
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, IMAGE_WORKERS=0):
+            name = default_storage.save(
+                'recipes/images/photo.png', ContentFile(image.getvalue()))
+            variants = submit_variants(name)
+            self.assertEqual(
+                {'small', 'medium', 'full'}, set(variants))
+            for variant, size in settings.IMAGE_VARIANTS.items():
+                self.assertEqual(
+                    get_variant_name(name, variant), variants[variant])
+                with default_storage.open(variants[variant]) as file:
+                    rendition = Image.open(file)
+                    self.assertEqual(size[0], rendition.width)
+                    self.assertLessEqual(rendition.height, size[1])
+
+    def test_recipe_image_variants_backfill(self):
+        image = BytesIO()
+        Image.new('RGB', (800, 800)).save(image, 'JPEG')
+        url = reverse('api:recipes-detail', kwargs={'id': self.recipe_2.id})
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root):
+            recipe = Recipe.objects.get(id=self.recipe_2.id)
+            recipe.image = default_storage.save(
+                'recipes/images/photo.jpg', ContentFile(image.getvalue()))
+            recipe.save()
+            response = self.client.get(url)
+            self.assertEqual(
+                response.data['image'], response.data['image_small'])
+            with capture_on_commit_callbacks():
+                call_command('backfill_image_variants', stdout=StringIO())
+            recipe.refresh_from_db()
+            self.assertEqual('recipes/images/photo_full.webp', recipe.image)
+            self.assertEqual(
+                'recipes/images/photo_small.webp', recipe.image_small)
+            self.assertEqual(
+                'recipes/images/photo_medium.webp', recipe.image_medium)
+            self.assertFalse(
+                default_storage.exists('recipes/images/photo.jpg'))
+            response = self.client.get(url)
+            self.assertTrue(
+                response.data['image'].endswith('photo_full.webp'))
+            self.assertTrue(
+                response.data['image_small'].endswith('photo_small.webp'))
+            self.assertTrue(
+                response.data['image_medium'].endswith('photo_medium.webp'))
+            call_command('backfill_image_variants', '--force',
+                         stdout=StringIO())
+            recipe.refresh_from_db()
+            self.assertEqual('recipes/images/photo_full.webp', recipe.image)
+            self.assertEqual(
+                'recipes/images/photo_small.webp', recipe.image_small)
+            self.assertEqual(
+                ['photo_full.webp', 'photo_medium.webp', 'photo_small.webp'],
+                sorted(default_storage.listdir('recipes/images')[1]))
+
+    def test_recipe_image_variants_errors_logged(self):
+        future = Future()
+        future.set_exception(OSError('broken image'))
+        with self.assertLogs('api.images', 'ERROR') as logs:
+            log_variant_errors(future)
+        self.assertIn('broken image', logs.output[0])
+
     def test_recipe_update_recipe(self):
         pk = self.recipe_1.id
         url = reverse('api:recipes-detail', kwargs={'id': pk})
@@ -163,6 +517,55 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(response_auth.status_code, status.HTTP_403_FORBIDDEN)
         self.assertEqual(Recipe.objects.get(id=1).name, "Recipe_4")
 
+    def test_recipe_update_recipe_diff(self):
+        url = reverse('api:recipes-detail', kwargs={'id': self.recipe_1.id})
+        auth_client_author = APIClient()
+        auth_client_author.force_authenticate(user=self.user_2)
+        pub_date = self.recipe_1.recipes_ingredient.get(
+            ingredient=self.ingredient_1).pub_date
+        data = {
+            "ingredients": [
+                {"id": self.ingredient_1.id, "amount": 20},
+                {"id": self.ingredient_2.id, "amount": 5}
+            ],
+            "tags": [1, 2],
+            "name": "recipe_1",
+            "text": "text_1",
+            "cooking_time": 1
+        }
+        with CaptureQueriesContext(connection) as context:
+            response = auth_client_author.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        writes = [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(2, len(writes))
+        self.assertIn('"recipes_recipeingredient"', writes[0])
+        self.assertIn('"recipes_recipe"', writes[1])
+        self.assertEqual(pub_date, self.recipe_1.recipes_ingredient.get(
+            ingredient=self.ingredient_1).pub_date)
+        self.assertEqual(5, self.recipe_1.recipes_ingredient.get(
+            ingredient=self.ingredient_2).amount)
+
+        data = {
+            "ingredients": [{"id": self.ingredient_2.id, "amount": 5}],
+            "tags": [3],
+        }
+        response = auth_client_author.patch(url, data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [self.ingredient_2], list(self.recipe_1.ingredients.all()))
+        self.assertEqual([self.tag_3], list(self.recipe_1.tags.all()))
+
+        response = auth_client_author.patch(
+            url, {"name": "recipe_1_new"}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [self.ingredient_2], list(self.recipe_1.ingredients.all()))
+        self.assertEqual(
+            "recipe_1_new", Recipe.objects.get(id=self.recipe_1.id).name)
+
     def test_recipe_delete_recipe(self):
         pk = self.recipe_1.id
         url = reverse('api:recipes-detail', kwargs={'id': pk})
@@ -202,6 +605,98 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(True, response_auth_before.data['is_in_shopping_cart'])
         self.assertNotEqual(True, response_auth_after.data['is_in_shopping_cart'])
 
+    def test_recipe_download_shopping_cart(self):
+        url = reverse('api:recipes-download-shopping-cart')
+        self.user_1.is_in_shopping_cart.add(self.recipe_1, self.recipe_2)
+        self.user_3.is_in_shopping_cart.add(self.recipe_2, self.recipe_3)
+        response = self.auth_client.get(url)
+        response_csv = self.auth_client.get(url, data={'format': 'csv'})
+        response_json = self.auth_client.get(url, data={'format': 'json'})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(
+            'ingredient_1 (pc) — 50\ningredient_2 (kg) — 20\n',
+            b''.join(response.streaming_content).decode())
+        self.assertEqual(
+            'name,measurement_unit,amount\r\n'
+            'ingredient_1,pc,50\r\ningredient_2,kg,20\r\n',
+            b''.join(response_csv.streaming_content).decode())
+        self.assertEqual(
+            [{'name': 'ingredient_1', 'measurement_unit': 'pc', 'amount': 50},
+             {'name': 'ingredient_2', 'measurement_unit': 'kg', 'amount': 20}],
+            json.loads(b''.join(response_json.streaming_content)))
+
+    def test_recipe_download_shopping_cart_errors(self):
+        url = reverse('api:recipes-download-shopping-cart')
+        response = self.client.get(url)
+        response_xml = self.auth_client.get(url, data={'format': 'xml'})
+        self.assertEqual(status.HTTP_401_UNAUTHORIZED, response.status_code)
+        self.assertEqual('application/json', response['Content-Type'])
+        self.assertIn('detail', response.json())
+        self.assertEqual(status.HTTP_404_NOT_FOUND, response_xml.status_code)
+        self.assertIn('detail', response_xml.json())
+
+    def test_recipe_download_shopping_cart_pdf(self):
+        url = reverse('api:recipes-download-shopping-cart')
+        self.user_1.is_in_shopping_cart.add(self.recipe_1)
+        with tempfile.TemporaryDirectory() as pdf_root, override_settings(
+                SHOPPING_CART_PDF_ROOT=pdf_root, PDF_RENDER_WORKERS=0):
+            response = self.auth_client.get(url, data={'format': 'pdf'})
+            user_dir = os.path.join(pdf_root, str(self.user_1.id))
+            cached = os.listdir(user_dir)
+            with mock.patch('api.pdf.render_pdf_file') as render:
+                response_cached = self.auth_client.get(
+                    url, data={'format': 'pdf'})
+            url_cached = reverse(
+                'api:recipes-download-shopping-cart-pdf',
+                kwargs={'job_id': cached[0][:-len('.pdf')]})
+            self.auth_client.post(reverse(
+                'api:recipes-shopping-cart', kwargs={'id': self.recipe_2.id}))
+            response_old = self.auth_client.get(url_cached)
+            with override_settings(PDF_RENDER_TIMEOUT=0):
+                response_changed = self.auth_client.get(
+                    url, data={'format': 'pdf'})
+            changed = os.listdir(user_dir)
+            job_id = '0' * 64
+            open(f'{get_pdf_path(self.user_1.id, job_id)}.pending',
+                 'w').close()
+            response_pending = self.auth_client.get(reverse(
+                'api:recipes-download-shopping-cart-pdf',
+                kwargs={'job_id': job_id}))
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual('application/pdf', response['Content-Type'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(1, len(cached))
+        self.assertEqual(status.HTTP_200_OK, response_cached.status_code)
+        render.assert_not_called()
+        self.assertEqual(status.HTTP_200_OK, response_old.status_code)
+        self.assertEqual(status.HTTP_200_OK, response_changed.status_code)
+        self.assertEqual(1, len(changed))
+        self.assertNotEqual(cached, changed)
+        self.assertEqual(status.HTTP_202_ACCEPTED, response_pending.status_code)
+        self.assertEqual('pending', response_pending.json()['status'])
+
+    def test_recipe_download_shopping_cart_pdf_failed(self):
+        url = reverse('api:recipes-download-shopping-cart')
+        self.user_1.is_in_shopping_cart.add(self.recipe_1)
+        with tempfile.TemporaryDirectory() as pdf_root, override_settings(
+                SHOPPING_CART_PDF_ROOT=pdf_root, PDF_RENDER_WORKERS=0):
+            with mock.patch('api.pdf.html_to_pdf', return_value=None):
+                response = self.auth_client.get(url, data={'format': 'pdf'})
+            response_status = self.auth_client.get(reverse(
+                'api:recipes-download-shopping-cart-pdf',
+                kwargs={'job_id': response.json()['job_id']}))
+            response_retry = self.auth_client.get(url, data={'format': 'pdf'})
+            files = os.listdir(os.path.join(pdf_root, str(self.user_1.id)))
+        self.assertEqual(
+            status.HTTP_500_INTERNAL_SERVER_ERROR, response.status_code)
+        self.assertEqual('failed', response.json()['status'])
+        self.assertEqual(
+            status.HTTP_500_INTERNAL_SERVER_ERROR,
+            response_status.status_code)
+        self.assertEqual(status.HTTP_200_OK, response_retry.status_code)
+        self.assertEqual(1, len(files))
+        self.assertTrue(files[0].endswith('.pdf'))
+
     def test_recipe_favorited_post(self):
         pk = self.recipe_2.id
         url = reverse('api:recipes-detail', kwargs={'id': pk})
@@ -227,6 +722,119 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(True, response_auth_before.data['is_favorited'])
         self.assertNotEqual(True, response_auth_after.data['is_favorited'])
 
+    def test_recipe_counters(self):
+        pk = self.recipe_2.id
+        url = reverse('api:recipes-detail', kwargs={'id': pk})
+        url_favorite = reverse('api:recipes-favorite', kwargs={'id': pk})
+        url_cart = reverse('api:recipes-shopping-cart', kwargs={'id': pk})
+        self.auth_client.post(url_favorite)
+        self.auth_client.post(url_favorite)
+        self.auth_client.post(url_cart)
+        recipe = Recipe.objects.get(id=pk)
+        self.assertEqual(1, recipe.favorites_count)
+        self.assertEqual(1, recipe.in_carts_count)
+        self.assertEqual(1, self.auth_client.get(url).data['favorites_count'])
+        self.auth_client.delete(url_favorite)
+        self.auth_client.delete(url_favorite)
+        self.assertEqual(0, Recipe.objects.get(id=pk).favorites_count)
+        fan = User.objects.create(email='fan@example.com', username='fan')
+        Favorite.objects.create(user=fan, recipe=self.recipe_2)
+        cart = ShoppingCart.objects.get(user=self.user_1, recipe=self.recipe_2)
+        cart.recipe = self.recipe_1
+        cart.save()
+        recipe = Recipe.objects.get(id=pk)
+        self.assertEqual(1, recipe.favorites_count)
+        self.assertEqual(0, recipe.in_carts_count)
+        self.assertEqual(
+            1, Recipe.objects.get(id=self.recipe_1.id).in_carts_count)
+        fan.delete()
+        self.assertEqual(0, Recipe.objects.get(id=pk).favorites_count)
+        stale = Recipe.objects.get(id=pk)
+        self.user_3.is_favorited.add(stale)
+        stale.name = 'renamed'
+        stale.save()
+        recipe = Recipe.objects.get(id=pk)
+        self.assertEqual(('renamed', 1), (recipe.name, recipe.favorites_count))
+        recipes_count = User.objects.get(id=self.user_2.id).recipes_count
+        recipe = Recipe.objects.create(
+            name='recipe_counter', text='text', cooking_time=1,
+            author=self.user_2)
+        self.assertEqual(recipes_count + 1,
+                         User.objects.get(id=self.user_2.id).recipes_count)
+        recipe.delete()
+        self.assertEqual(recipes_count,
+                         User.objects.get(id=self.user_2.id).recipes_count)
+        author = User.objects.get(id=self.user_2.id)
+        Recipe.objects.create(
+            name='recipe_counter', text='text', cooking_time=1,
+            author=self.user_2)
+        author.first_name = 'renamed'
+        author.save()
+        self.assertEqual(recipes_count + 1,
+                         User.objects.get(id=self.user_2.id).recipes_count)
+
+    def test_recipe_ordering(self):
+        now = timezone.now()
+        for user, age in ((self.user_1, 240), (self.user_2, 240),
+                          (self.user_3, 24)):
+            recipe = self.recipe_2 if age == 24 else self.recipe_1
+            favorite = Favorite.objects.create(user=user, recipe=recipe)
+            Favorite.objects.filter(id=favorite.id).update(
+                pub_date=now - timedelta(hours=age))
+        Recipe.objects.filter(id=self.recipe_3.id).update(trending_score=5)
+        reconcile_counters()
+        self.assertEqual(2, update_trending_scores(now=now))
+        self.assertAlmostEqual(
+            0.5, Recipe.objects.get(id=self.recipe_2.id).trending_score)
+        url = reverse('api:recipes-list')
+        with CaptureQueriesContext(connection) as queries_default:
+            self.auth_client.get(url, data={'limit': 2})
+        for ordering, expected in (
+            ('popular', [self.recipe_1, self.recipe_2, self.recipe_3]),
+            ('trending', [self.recipe_2, self.recipe_3, self.recipe_1]),
+        ):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.auth_client.get(
+                    url, data={'ordering': ordering, 'limit': 2})
+            self.assertEqual(len(queries_default), len(queries))
+            self.assertEqual(
+                [recipe.id for recipe in expected[:2]],
+                [recipe['id'] for recipe in response.data['results']])
+            response_cursor = self.auth_client.get(
+                url, data={'ordering': ordering, 'pagination': 'cursor',
+                           'limit': 2})
+            response_next = self.auth_client.get(response_cursor.data['next'])
+            self.assertEqual(
+                [recipe.id for recipe in expected],
+                [recipe['id'] for recipe in response_cursor.data['results']
+                 + response_next.data['results']])
+        response_invalid = self.auth_client.get(
+            url, data={'ordering': 'name'})
+        self.assertEqual(
+            status.HTTP_400_BAD_REQUEST, response_invalid.status_code)
+
+    def test_recipe_ordering_many_ties(self):
+        Recipe.objects.bulk_create(
+            Recipe(name=f'recipe_tie_{number}', text='text', cooking_time=1,
+                   author=self.user_3)
+            for number in range(1150)
+        )
+        total = Recipe.objects.count()
+        url = reverse('api:recipes-list')
+        for ordering in ('popular', 'trending'):
+            ids = []
+            response = self.auth_client.get(url, data={
+                'ordering': ordering, 'pagination': 'cursor', 'limit': 100})
+            while True:
+                self.assertEqual(status.HTTP_200_OK, response.status_code)
+                ids.extend(recipe['id'] for recipe in response.data['results'])
+                if response.data['next'] is None:
+                    break
+                self.assertLess(len(ids), total)
+                response = self.auth_client.get(response.data['next'])
+            self.assertEqual(total, len(ids))
+            self.assertEqual(total, len(set(ids)))
+
     def test_recipe_search_author(self):
         url = reverse('api:recipes-list')
         response = self.client.get(url, data={'author': 3})
@@ -241,6 +849,23 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer_data, response.data)
 
+    def test_recipe_search_multiple_tags(self):
+        url = reverse('api:recipes-list')
+        self.auth_client.get(url, data={'tags': 'tag1'})
+        with CaptureQueriesContext(connection) as queries_all:
+            self.auth_client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.auth_client.get(
+                url, data={'tags': ['tag1', 'tag2'], 'limit': 10})
+        self.assertEqual(len(queries_all) + 1, len(queries))
+        response_invalid = self.auth_client.get(url, data={'tags': 'unknown'})
+        ids = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([self.recipe_3.id, self.recipe_1.id], ids)
+        self.assertEqual(2, response.data['count'])
+        self.assertEqual(
+            status.HTTP_400_BAD_REQUEST, response_invalid.status_code)
+
     def test_ingredient_get_list(self):
         url = reverse('api:ingredients-list')
         response = self.client.get(url)
@@ -263,6 +888,41 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer_data, response.data)
 
+    def test_ingredient_search_ranking(self):
+        url = reverse('api:ingredients-list')
+        sea_salt = Ingredient.objects.create(
+            name='Морская соль', measurement_unit='г')
+        salt = Ingredient.objects.create(name='Соль', measurement_unit='г')
+        Ingredient.objects.create(name='Сахар', measurement_unit='г')
+        response = self.client.get(url, data={'name': 'СОЛ'})
+        serializer_data = IngredientSerializer([salt, sea_salt], many=True).data
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(serializer_data, response.data)
+
+    @override_settings(INGREDIENT_SEARCH_BACKEND='memory')
+    def test_ingredient_catalog(self):
+        url = reverse('api:ingredients-list')
+        url_detail = reverse(
+            'api:ingredients-detail', kwargs={'id': self.ingredient_2.id})
+        sea_salt = Ingredient.objects.create(
+            name='морская соль', measurement_unit='г')
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, data={'name': 'сол'})
+            response_detail = self.client.get(url_detail)
+        self.assertEqual(
+            IngredientSerializer([salt, sea_salt], many=True).data,
+            response.data)
+        self.assertEqual(
+            IngredientSerializer(self.ingredient_2).data, response_detail.data)
+        sea_salt.delete()
+        response = self.client.get(url)
+        self.assertEqual(
+            IngredientSerializer(
+                [self.ingredient_1, self.ingredient_2, salt], many=True).data,
+            response.data)
+
     def test_tag_get_list(self):
         url = reverse('api:tags-list')
         response = self.client.get(url)
@@ -270,6 +930,27 @@ class RecipesApiTestCase(APITestCase):
         self.assertEqual(status.HTTP_200_OK, response.status_code)
         self.assertEqual(serializer_data, response.data)
 
+    def test_tag_get_list_etag(self):
+        url = reverse('api:tags-list')
+        response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response_cached = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.tag_1.name = 'tag_1_new'
+        self.tag_1.save()
+        response_changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        response_since = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response_changed['Last-Modified'])
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED,
+                         response_cached.status_code)
+        self.assertEqual(etag, response_cached['ETag'])
+        self.assertEqual(status.HTTP_200_OK, response_changed.status_code)
+        self.assertNotEqual(etag, response_changed['ETag'])
+        self.assertEqual('tag_1_new', response_changed.data[2]['name'])
+        self.assertEqual(status.HTTP_304_NOT_MODIFIED,
+                         response_since.status_code)
+
     def test_tag_get_detail(self):
         pk = self.tag_2.id
         url = reverse('api:tags-detail', kwargs={'id': pk})
@@ -297,6 +978,8 @@ class RecipeSerializerTestCase(TestCase):
             author=user_1
         )
         data = RecipesSerializer(recipe_1).data
+        image_url = ('/media/data%3Aimage/png%3Bbase64%2CiVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVBMVEUAAAD/9'
+                     'fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg%3D%3D')
         expected_data = {
             'id': 1,
             'tags': [],
@@ -310,10 +993,12 @@ class RecipeSerializerTestCase(TestCase):
             'is_favorited': False,
             'is_in_shopping_cart': False,
             'name': 'recipe_1',
-            'image': ('/media/data%3Aimage/png%3Bbase64%2CiVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVBMVEUAAAD/9'
-                      'fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5ErkJggg%3D%3D'),
+            'image': image_url,
+            'image_small': image_url,
+            'image_medium': image_url,
             'text': 'text_1',
             'cooking_time': 1,
+            'favorites_count': 0,
         }
         self.assertEqual(expected_data, data)
 
@@ -343,4 +1028,43 @@ class RecipeSerializerTestCase(TestCase):
             "color": "#f00000",
             "slug": "tag1",
         }
-        self.assertEqual(expected_data, data)
\ No newline at end of file
+        self.assertEqual(expected_data, data)
+
+
+class RecipeFilterIndexTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            email='index@example.com',
+            username='index',
+            first_name='index',
+            last_name='index',
+            password='index',
+        )
+        cls.tag = Tag.objects.create(name='index', color='#000000', slug='index')
+
+    def test_recipe_filter_uses_indexes(self):
+        request = APIRequestFactory().get('/')
+        request.user = self.user
+        filters = {
+            'tags': ['index'],
+            'author': self.user.id,
+            'is_favorited': '1',
+            'is_in_shopping_cart': '1',
+        }
+        for size in range(1, len(filters) + 1):
+            for names in itertools.combinations(filters, size):
+                data = QueryDict(mutable=True)
+                for name in names:
+                    value = filters[name]
+                    if isinstance(value, list):
+                        data.setlist(name, value)
+                    else:
+                        data[name] = value
+                queryset = RecipeFilter(
+                    data, Recipe.objects.all(), request=request).qs
+                plan = queryset.explain()
+                with self.subTest(filters=names):
+                    self.assertNotRegex(plan, r'SCAN \w+\s*$')
+                    self.assertNotRegex(plan, r'SCAN \w+\n')
@@ -1,11 +1,17 @@
+from io import StringIO
 from unittest import TestCase
 
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient, APITestCase
 
 from api.serializers import UserSerializer
-from users.models import Follow, User
+from api.testing import assert_queries_independent_of_page_size
+from recipes.models import Recipe
+from users.models import FeedEntry, Follow, User
 
 
 class UsersApiTestCase(APITestCase):
@@ -103,6 +109,126 @@ class UsersApiTestCase(APITestCase):
         self.assertEqual(0, queryset_before)
         self.assertEqual(1, queryset_after)
 
+    def test_user_subscriptions_queries_count(self):
+        url = reverse('api:users-subscriptions')
+        for number in range(5):
+            author = User.objects.create(
+                email=f'author{number}@example.com',
+                username=f'author_{number}',
+                first_name='author',
+                last_name='author',
+                password='author',
+            )
+            for recipe_number in range(3):
+                Recipe.objects.create(
+                    name=f'recipe_{number}_{recipe_number}',
+                    text='text',
+                    cooking_time=1,
+                    author=author
+                )
+            Follow.objects.create(user=self.user_1, author=author)
+        with CaptureQueriesContext(connection) as small_page:
+            self.auth_client.get(url, data={'limit': 1, 'recipes_limit': 2})
+        with CaptureQueriesContext(connection) as full_page:
+            response = self.auth_client.get(
+                url, data={'limit': 5, 'recipes_limit': 2})
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual(len(small_page), len(full_page))
+        self.assertEqual(5, len(response.data['results']))
+        for author in response.data['results']:
+            self.assertTrue(author['is_subscribed'])
+            self.assertEqual(3, author['recipes_count'])
+            self.assertEqual(2, len(author['recipes']))
+        response_cursor = self.auth_client.get(
+            url, data={'pagination': 'cursor', 'limit': 3})
+        response_next = self.auth_client.get(response_cursor.data['next'])
+        self.assertEqual(3, len(response_cursor.data['results']))
+        self.assertEqual(2, len(response_next.data['results']))
+        self.assertIsNone(response_next.data['next'])
+
+    def test_user_feed(self):
+        url = reverse('api:recipes-feed')
+        author = self.user_2
+        old = [Recipe.objects.create(
+            name=f'old_{number}', text='text', cooking_time=1, author=author)
+            for number in range(3)]
+        url_subscribe = reverse('api:users-subscribe', kwargs={'id': author.id})
+        with self.settings(FEED_BACKFILL_SIZE=2):
+            self.auth_client.post(url_subscribe)
+        response = self.auth_client.get(url)
+        self.assertEqual(status.HTTP_200_OK, response.status_code)
+        self.assertEqual([old[2].id, old[1].id],
+                         [item['id'] for item in response.data['results']])
+        new = Recipe.objects.create(
+            name='new', text='text', cooking_time=1, author=author)
+        Recipe.objects.create(
+            name='own', text='text', cooking_time=1, author=self.user_1)
+        response = self.auth_client.get(url, data={'limit': 2})
+        response_next = self.auth_client.get(response.data['next'])
+        self.assertEqual(
+            [new.id, old[2].id, old[1].id],
+            [item['id'] for item in response.data['results']
+             + response_next.data['results']])
+        self.assertTrue(response.data['results'][0]['author']['is_subscribed'])
+        self.auth_client.delete(url_subscribe)
+        self.assertEqual([], self.auth_client.get(url).data['results'])
+        self.assertEqual(
+            status.HTTP_401_UNAUTHORIZED, self.client.get(url).status_code)
+
+    def test_user_feed_rebuild(self):
+        recipes = [Recipe.objects.create(
+            name=f'recipe_{number}', text='text', cooking_time=1,
+            author=self.user_2) for number in range(3)]
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        self.assertEqual([], self.auth_client.get(
+            reverse('api:recipes-feed')).data['results'])
+        output = StringIO()
+        call_command('rebuild_feed', stdout=output)
+        self.assertIn('Записей в лентах: 3', output.getvalue())
+        response = self.auth_client.get(reverse('api:recipes-feed'))
+        self.assertEqual(
+            [recipe.id for recipe in reversed(recipes)],
+            [item['id'] for item in response.data['results']])
+
+    def test_user_feed_rebuild_keeps_history(self):
+        url_subscribe = reverse(
+            'api:users-subscribe', kwargs={'id': self.user_2.id})
+        self.auth_client.post(url_subscribe)
+        recipes = [Recipe.objects.create(
+            name=f'recipe_{number}', text='text', cooking_time=1,
+            author=self.user_2) for number in range(3)]
+        FeedEntry.objects.create(
+            user=self.user_2, recipe=recipes[0], author=self.user_2,
+            pub_date=recipes[0].pub_date)
+        with self.settings(FEED_BACKFILL_SIZE=1):
+            call_command('rebuild_feed', stdout=StringIO())
+        response = self.auth_client.get(reverse('api:recipes-feed'))
+        self.assertEqual(
+            [recipe.id for recipe in reversed(recipes)],
+            [item['id'] for item in response.data['results']])
+        self.assertFalse(FeedEntry.objects.filter(user=self.user_2).exists())
+
+    def test_user_subscriptions_page_size_independent(self):
+        User.objects.bulk_create(
+            User(email=f'author{number}@example.com',
+                 username=f'author_{number}', first_name='author',
+                 last_name='author', password='author')
+            for number in range(100)
+        )
+        authors = User.objects.filter(username__startswith='author_')
+        Recipe.objects.bulk_create(
+            Recipe(name=f'recipe_{author.id}', text='text', cooking_time=1,
+                   author=author)
+            for author in authors
+        )
+        Follow.objects.bulk_create(
+            Follow(user=self.user_1, author=author) for author in authors)
+        assert_queries_independent_of_page_size(
+            self, self.auth_client, reverse('api:users-subscriptions'),
+            {'recipes_limit': 2})
+        assert_queries_independent_of_page_size(
+            self, self.client, reverse('api:users-list'))
+
 
 class UserSerializerTestCase(TestCase):
     def test_serializer(self):
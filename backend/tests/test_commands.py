@@ -0,0 +1,229 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.management.commands import import_ingredients
+from core.management.commands.profile_summary import summarize_collapsed
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import FeedEntry, Follow, User
+
+
+class ImportIngredientsTestCase(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w', encoding='utf8') as file:
+            file.write(content)
+        return path
+
+    def test_import_csv_is_idempotent(self):
+        path = self.write(
+            'ingredients.csv',
+            'абрикосовое варенье,г\n'
+            'абрикосовое пюре,г\n'
+            'абрикосовое пюре,г\n'
+            ',г\n'
+        )
+        output = StringIO()
+        call_command('import_ingredients', path, '--batch-size', '2',
+                     stdout=output)
+        self.assertIn('добавлено: 2', output.getvalue())
+        self.assertIn('пропущено: 1', output.getvalue())
+        call_command('import_ingredients', path, stdout=StringIO())
+        self.assertEqual(
+            ['абрикосовое варенье', 'абрикосовое пюре'],
+            sorted(Ingredient.objects.values_list('name', flat=True)))
+        self.assertEqual(
+            'абрикосовое варенье',
+            Ingredient.objects.get(name_lower='абрикосовое варенье').name)
+
+    def test_import_json_streaming(self):
+        rows = [
+            {'name': f'Ингредиент {number}', 'measurement_unit': 'г'}
+            for number in range(50)
+        ]
+        path = self.write('ingredients.json', json.dumps(rows))
+        # Маленькие порции, чтобы объекты попадали на границы чтения.
+        with mock.patch.object(import_ingredients, 'JSON_CHUNK_SIZE', 7):
+            call_command('import_ingredients', path, stdout=StringIO())
+        self.assertEqual(50, Ingredient.objects.count())
+        path = self.write(
+            'ingredients.ndjson',
+            '\n'.join(json.dumps(row) for row in rows[40:] + [
+                {'name': 'Новый', 'measurement_unit': 'кг'}]))
+        call_command('import_ingredients', path, '--format', 'json',
+                     stdout=StringIO())
+        self.assertEqual(51, Ingredient.objects.count())
+
+
+class ExportImportRecipesTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            email='author@example.com', username='author')
+        cls.user = User.objects.create(
+            email='user@example.com', username='user')
+        cls.tag = Tag.objects.create(name='Завтрак', color='#fff', slug='b')
+        cls.ingredient = Ingredient.objects.create(
+            name='соль', measurement_unit='г')
+        cls.recipe = Recipe.objects.create(
+            name='Рецепт', text='Текст', cooking_time=5, author=cls.author)
+        cls.recipe.ingredients.add(
+            cls.ingredient, through_defaults={'amount': 2.5})
+        cls.recipe.tags.add(cls.tag)
+        cls.user.is_favorited.add(cls.recipe)
+        cls.user.is_in_shopping_cart.add(cls.recipe)
+        Follow.objects.create(user=cls.user, author=cls.author)
+
+    def test_export_import_recipes(self):
+        FeedEntry.objects.create(
+            user=self.user, recipe=self.recipe, author=self.author,
+            pub_date=self.recipe.pub_date)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'recipes.ndjson')
+            call_command('export_recipes', path, stderr=StringIO())
+            with open(path, encoding='utf8') as file:
+                types = [json.loads(line)['type'] for line in file]
+            self.assertEqual(
+                ['user', 'user', 'tag', 'ingredient', 'recipe',
+                 'favorite', 'shopping_cart', 'follow'], types)
+            call_command('import_recipes', path, stdout=StringIO())
+
+        self.assertEqual(2, User.objects.count())
+        self.assertEqual(1, Ingredient.objects.count())
+        self.assertEqual(1, Follow.objects.count())
+        copy = Recipe.objects.exclude(id=self.recipe.id).get()
+        self.assertEqual(self.author, copy.author)
+        self.assertEqual(self.recipe.pub_date, copy.pub_date)
+        self.assertEqual([self.tag], list(copy.tags.all()))
+        self.assertEqual(
+            [(self.ingredient.id, 2.5)],
+            list(copy.recipes_ingredient.values_list(
+                'ingredient_id', 'amount')))
+        self.assertEqual(2, self.user.is_favorited.count())
+        self.assertEqual(2, self.user.is_in_shopping_cart.count())
+        self.assertEqual(
+            {self.recipe.id, copy.id},
+            set(FeedEntry.objects.filter(user=self.user).values_list(
+                'recipe_id', flat=True)))
+
+
+class BenchmarkTestCase(TestCase):
+
+    def test_seed_and_run_benchmark(self):
+        call_command(
+            'seed_benchmark', '--users', '20', '--recipes', '50',
+            '--ingredients', '30', '--tags', '3', stdout=StringIO())
+        self.assertEqual(50, Recipe.objects.count())
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+
+        cache.set('run_benchmark_test', 1)
+        output = StringIO()
+        call_command('run_benchmark', '--iterations', '2',
+                     stdout=output, stderr=StringIO())
+        self.assertEqual(1, cache.get('run_benchmark_test'))
+        report = json.loads(output.getvalue())
+        self.assertEqual(16, len([
+            name for name in report['results']
+            if name.startswith('recipes_list')]))
+        for name, result in report['results'].items():
+            self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+            self.assertTrue(
+                all(status < 400 for status in result['statuses']), name)
+        self.assertEqual(50, Recipe.objects.count())
+
+    def test_bench_ingredients(self):
+        output = StringIO()
+        call_command('bench_ingredients', '--size', '20000',
+                     '--queries', '5', stdout=output)
+        self.assertIn('20000 ингредиентов, 5 запросов', output.getvalue())
+        self.assertFalse(Ingredient.objects.exists())
+
+
+class ReconcileCountersTestCase(TestCase):
+
+    def test_reconcile_counters(self):
+        author = User.objects.create(email='a@example.com', username='a')
+        user = User.objects.create(email='b@example.com', username='b')
+        recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=1, author=author)
+        user.is_favorited.add(recipe)
+        user.is_in_shopping_cart.add(recipe)
+        Recipe.objects.filter(id=recipe.id).update(
+            favorites_count=3, in_carts_count=0)
+        User.objects.filter(id=author.id).update(recipes_count=5)
+        output = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=output)
+        self.assertIn('favorites_count: 1, in_carts_count: 1, '
+                      'recipes_count: 1', output.getvalue())
+        call_command('reconcile_counters', stdout=StringIO())
+        recipe.refresh_from_db()
+        self.assertEqual(1, recipe.favorites_count)
+        self.assertEqual(1, recipe.in_carts_count)
+        self.assertEqual(1, User.objects.get(id=author.id).recipes_count)
+        output = StringIO()
+        call_command('reconcile_counters', '--dry-run', stdout=output)
+        self.assertIn('favorites_count: 0, in_carts_count: 0, '
+                      'recipes_count: 0', output.getvalue())
+
+
+class ProfilingTestCase(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(PROFILE_DIR=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.staff = User.objects.create(
+            email='staff@example.com', username='staff', is_staff=True)
+        self.user = User.objects.create(
+            email='user@example.com', username='user')
+
+    def get(self, user, **headers):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        return client.get(reverse('api:recipes-list'), **headers)
+
+    def test_profile_by_header_and_summary(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='1')
+        name = response['X-Profile-Id']
+        self.assertTrue(name.endswith('-RecipesViewSet.list.prof'))
+        self.assertFalse(self.get(self.user, HTTP_X_PROFILE='1').has_header(
+            'X-Profile-Id'))
+        with override_settings(PROFILE_SAMPLE_RATE=1):
+            self.assertFalse(self.get(self.user).has_header('X-Profile-Id'))
+        output = StringIO()
+        call_command('profile_summary', stdout=output)
+        files = [line.split('\t')[0]
+                 for line in output.getvalue().splitlines()]
+        self.assertEqual(2, len(files))
+        self.assertIn(name, files)
+        self.assertTrue(files[0].endswith('.collapsed'))
+        output = StringIO()
+        call_command('profile_summary', '--latest', '2', stdout=output)
+        self.assertIn('cProfile, профилей: 1', output.getvalue())
+        self.assertIn('dispatch', output.getvalue())
+        self.assertIn('Выборки стеков, профилей: 1', output.getvalue())
+
+    def test_summarize_collapsed(self):
+        own, total = summarize_collapsed(
+            {'a;b;c': 3, 'a;b': 1, 'a;d (x.py:1)': 2})
+        self.assertEqual({'c': 3, 'b': 1, 'd (x.py:1)': 2}, own)
+        self.assertEqual(6, total['a'])
+        self.assertEqual(4, total['b'])
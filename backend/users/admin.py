@@ -1,15 +1,25 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Follow, User
+from .models import Favorite, Follow, ShoppingCart, User
+
+
+class FavoriteInline(admin.TabularInline):
+    model = Favorite
+    extra = 1
+
+
+class ShoppingCartInline(admin.TabularInline):
+    model = ShoppingCart
+    extra = 1
 
 
 @admin.register(User)
 class UserAdmin(UserAdmin):
+    inlines = (FavoriteInline, ShoppingCartInline)
     fieldsets = (
         (None, {"fields": ('username', "email", "password")}),
         (("Личные данные"), {"fields": ("first_name", "last_name")}),
-        (("Подписки"), {"fields": ("is_favorited", "is_in_shopping_cart")}),
         (("Полномочия"), {
             "fields": (
                 "is_active",
@@ -31,6 +41,7 @@ class UserAdmin(UserAdmin):
         'first_name',
         'last_name',
         'email',
+        'recipes_count',
     )
 
     search_fields = (
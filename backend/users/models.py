@@ -1,11 +1,12 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 
-from core.models import CreatedModel
+from core.models import CounterFieldsMixin, CreatedModel
 from recipes.models import Recipe
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
+    counter_fields = ('recipes_count',)
     username = models.CharField(
         unique=True,
         max_length=150,
@@ -27,14 +28,21 @@ class User(AbstractUser):
     )
     is_favorited = models.ManyToManyField(
         Recipe,
+        through='Favorite',
         related_name='favorited',
         blank=True,
     )
     is_in_shopping_cart = models.ManyToManyField(
         Recipe,
+        through='ShoppingCart',
         related_name='shopping_cart',
         blank=True,
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Количество рецептов',
+        default=0,
+        editable=False,
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username', 'password', ]
@@ -43,6 +51,10 @@ class User(AbstractUser):
         verbose_name = 'Пользователи'
         verbose_name_plural = 'Пользователи'
         ordering = ['-date_joined']
+        indexes = [
+            models.Index(fields=['-date_joined', '-id'],
+                         name='user_date_joined_id_idx'),
+        ]
 
     def __str__(self):
         return self.username
@@ -67,3 +79,103 @@ class Follow(CreatedModel):
         ]
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+
+
+class Favorite(CreatedModel):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='favorites',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='favorites',
+        verbose_name='Рецепт',
+    )
+
+    class Meta:
+        db_table = 'users_user_is_favorited'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_favorite')
+        ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='favorite_recipe_user_idx'),
+            models.Index(fields=['pub_date'],
+                         name='favorite_pub_date_idx'),
+        ]
+        verbose_name = 'Избранное'
+        verbose_name_plural = 'Избранное'
+
+
+class ShoppingCart(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_carts',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='shopping_carts',
+        verbose_name='Рецепт',
+    )
+
+    class Meta:
+        db_table = 'users_user_is_in_shopping_cart'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_shopping_cart')
+        ]
+        indexes = [
+            models.Index(fields=['recipe', 'user'],
+                         name='shopping_cart_recipe_user_idx'),
+        ]
+        verbose_name = 'Список покупок'
+        verbose_name_plural = 'Списки покупок'
+
+
+class FeedEntry(models.Model):
+    """
+    Рецепт в ленте подписчика автора. Заполняется при публикации
+    рецепта и при подписке, читается по (user, -pub_date, -id).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации рецепта',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'recipe'],
+                                    name='unique_feed_entry')
+        ]
+        indexes = [
+            models.Index(fields=['user', '-pub_date', '-id'],
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+        verbose_name = 'Лента'
+        verbose_name_plural = 'Ленты'
@@ -0,0 +1,64 @@
+"""
+Операции для перевода существующей базы на модели Favorite и
+ShoppingCart. Таблицы связей остаются прежними, поэтому модели
+добавляются только в состояние миграций, а в базе появляется лишь
+Favorite.pub_date. Ограничения и индексы затем создает обычная
+миграция из makemigrations. Порядок действий описан в README.
+"""
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+FAVORITE_THROUGH_OPERATIONS = [
+    migrations.SeparateDatabaseAndState(state_operations=[
+        migrations.CreateModel(
+            name='Favorite',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True,
+                    serialize=False, verbose_name='ID')),
+                ('user', models.ForeignKey(
+                    on_delete=models.CASCADE, related_name='favorites',
+                    to=settings.AUTH_USER_MODEL)),
+                ('recipe', models.ForeignKey(
+                    on_delete=models.CASCADE, related_name='favorites',
+                    to='recipes.Recipe')),
+            ],
+            options={'db_table': 'users_user_is_favorited'},
+        ),
+        migrations.CreateModel(
+            name='ShoppingCart',
+            fields=[
+                ('id', models.AutoField(
+                    auto_created=True, primary_key=True,
+                    serialize=False, verbose_name='ID')),
+                ('user', models.ForeignKey(
+                    on_delete=models.CASCADE,
+                    related_name='shopping_carts',
+                    to=settings.AUTH_USER_MODEL)),
+                ('recipe', models.ForeignKey(
+                    on_delete=models.CASCADE,
+                    related_name='shopping_carts',
+                    to='recipes.Recipe')),
+            ],
+            options={'db_table': 'users_user_is_in_shopping_cart'},
+        ),
+        migrations.AlterField(
+            model_name='user', name='is_favorited',
+            field=models.ManyToManyField(
+                blank=True, related_name='favorited',
+                through='users.Favorite', to='recipes.Recipe')),
+        migrations.AlterField(
+            model_name='user', name='is_in_shopping_cart',
+            field=models.ManyToManyField(
+                blank=True, related_name='shopping_cart',
+                through='users.ShoppingCart', to='recipes.Recipe')),
+    ]),
+    migrations.AddField(
+        model_name='favorite', name='pub_date',
+        field=models.DateTimeField(
+            auto_now_add=True, default=timezone.now,
+            verbose_name='Дата создания'),
+        preserve_default=False,
+    ),
+]